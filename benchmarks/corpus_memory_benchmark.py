@@ -0,0 +1,56 @@
+"""Measures the memory footprint of fully parsed song corpora.
+
+Every song under songs/ is parsed into a SongIR, from which SongMeta, the
+HTML model (read_song_xml) and the LaTeX model (song2tex) are derived, all
+blocks and rows included. With scale N each file is parsed N times, which
+simulates a corpus N times bigger.
+
+Usage: PYTHONPATH=. python3 benchmarks/corpus_memory_benchmark.py [scale ...]   (default: 1 20)
+"""
+
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+import src.lib.songbook as sb
+from src.lib.list_of_songs import SongMeta
+from src.lib.song_ir import parse_song
+from src.lib.read_song_xml import Song as HtmlSong
+from src.latex.song2tex import Song as TexSong
+
+
+def parse_corpus(files, scale):
+    """All models of every file, scale times over"""
+    corpus = []
+    for _ in range(scale):
+        for path in files:
+            song = parse_song(path)
+            corpus.append((song, SongMeta.fromIR(song), HtmlSong.fromIR(song), TexSong.fromIR(song)))
+    return corpus
+
+
+def measure(files, scale):
+    tracemalloc.start()
+    start = time.perf_counter()
+    corpus = parse_corpus(files, scale)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rows = sum(len(block.rows) for _, _, song, _ in corpus for block in song.blocks)
+    print(f"scale {scale:>3}: {len(corpus):>6} songs, {rows:>7} rows, "
+          f"resident {current / 2**20:8.1f} MiB ({current / len(corpus) / 1024:5.1f} KiB/song), "
+          f"peak {peak / 2**20:8.1f} MiB, {elapsed:6.1f}s")
+    return current
+
+
+def main():
+    scales = [int(s) for s in sys.argv[1:]] or [1, 20]
+    files = sorted(glob.glob(os.path.join(sb.repo_dir(), "songs/**/*.xml"), recursive=True))
+    for scale in scales:
+        measure(files, scale)
+
+
+if __name__ == "__main__":
+    main()
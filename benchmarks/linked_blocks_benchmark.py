@@ -0,0 +1,49 @@
+"""Measures building the HTML and LaTeX song models, whose linked blocks
+(e.g. repeated choruses) reuse the rows of the block they refer to.
+
+Song IRs are parsed up front, so only the models are timed. By default the
+chorus-heavy songs of songs/pl/harc are used.
+
+Usage: PYTHONPATH=. python3 benchmarks/linked_blocks_benchmark.py [repetitions] [song.xml ...]
+"""
+
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+import src.lib.songbook as sb
+from src.lib.song_ir import parse_song
+from src.lib.read_song_xml import Song as HtmlSong
+from src.latex.song2tex import Song as TexSong
+
+
+def measure(name, songs, from_ir, repetitions):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        for song in songs:
+            from_ir(song)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    models = [from_ir(song) for song in songs]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:>5}: {elapsed / repetitions / len(songs) * 1e6:7.1f} us/song, "
+          f"models of all songs take {current / 1024:8.1f} KiB")
+    return models
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    files = sys.argv[2:] or sorted(glob.glob(os.path.join(sb.repo_dir(), "songs/pl/harc/*.xml")))
+    songs = [parse_song(f) for f in files]
+    blocks = sum(len(song.blocks) for song in songs)
+    linked = sum(block.linked for song in songs for block in song.blocks)
+    print(f"{len(songs)} songs, {blocks} blocks, of which {linked} linked; {repetitions} repetitions")
+    measure("html", songs, HtmlSong.fromIR, repetitions)
+    measure("tex", songs, TexSong.fromIR, repetitions)
+
+
+if __name__ == "__main__":
+    main()
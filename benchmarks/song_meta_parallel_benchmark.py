@@ -0,0 +1,45 @@
+"""Measures how parsing song metadata scales with the number of worker processes.
+
+Every song under songs/ is parsed into SongMeta without the metadata cache
+(list_of_songs.load_song_metas(cache=False)), with each number of jobs. With
+scale N the list of files is repeated N times, which simulates a corpus N times
+bigger. Every run has to return the same metadata as the serial one.
+
+Usage: PYTHONPATH=. python3 benchmarks/song_meta_parallel_benchmark.py [scale ...]   (default: 1 10)
+    Numbers of jobs are taken from $BENCHMARK_JOBS (default: "1 2 4 8").
+"""
+
+import glob
+import os
+import sys
+import time
+
+import src.lib.list_of_songs as loslib
+import src.lib.songbook as sb
+
+
+def measure(files, jobs):
+    start = time.perf_counter()
+    songs = loslib.load_song_metas(files, cache=False, jobs=jobs)
+    return time.perf_counter() - start, [song.to_dict() for song in songs]
+
+
+def main():
+    scales = [int(s) for s in sys.argv[1:]] or [1, 10]
+    all_jobs = [int(j) for j in os.environ.get("BENCHMARK_JOBS", "1 2 4 8").split()]
+    files = sorted(glob.glob(os.path.join(sb.repo_dir(), "songs/**/*.xml"), recursive=True))
+    print(f"{os.cpu_count()} CPUs")
+    for scale in scales:
+        corpus = files * scale
+        serial_time, expected = measure(corpus, 1)
+        for jobs in all_jobs:
+            elapsed, songs = measure(corpus, jobs) if jobs != 1 else (serial_time, expected)
+            if songs != expected:
+                print(f"scale {scale}, {jobs} jobs: metadata differs from the serial parse", file=sys.stderr)
+                exit(1)
+            print(f"scale {scale:>3}: {len(corpus):>6} songs, {jobs:>2} jobs: {elapsed:6.2f}s "
+                  f"(speedup {serial_time / elapsed:4.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Compares the time and peak memory of parsing song metadata with
+SongMeta.parseFile(), which skips the <lyric> subtree, and with the full parse
+of the XML.
+
+With scale N each file is parsed N times, which simulates a corpus N times
+bigger. Each variant runs in a process of its own, so that its peak resident
+memory (which includes lxml's trees, unlike tracemalloc) can be compared.
+
+Usage: PYTHONPATH=. python3 benchmarks/song_meta_parse_benchmark.py [scale ...]   (default: 1 10)
+"""
+
+import glob
+import os
+import sys
+import resource
+import subprocess
+import time
+
+from lxml import etree
+
+import src.lib.songbook as sb
+from src.lib.list_of_songs import SongMeta
+
+
+def full_parse(path):
+    return SongMeta.parseDOM(etree.parse(path).getroot(), path)
+
+
+VARIANTS = {"full parse": full_parse, "parseFile": SongMeta.parseFile}
+
+
+def measure(name, files, scale):
+    """Parses the files with the variant in this process and prints its time and peak memory"""
+    start = time.perf_counter()
+    for _ in range(scale):
+        for path in files:
+            VARIANTS[name](path)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+    print(f"{elapsed} {peak}")
+
+
+def run(name, scale):
+    """(time, peak resident memory in KiB) of the variant, measured in a new process"""
+    result = subprocess.run([sys.executable, __file__, "--measure", name, str(scale)],
+                            capture_output=True, text=True, check=True)
+    elapsed, peak = result.stdout.split()
+    return float(elapsed), int(peak)
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--measure":
+        files = sorted(glob.glob(os.path.join(sb.repo_dir(), "songs/**/*.xml"), recursive=True))
+        measure(sys.argv[2], files, int(sys.argv[3]))
+        return
+    scales = [int(s) for s in sys.argv[1:]] or [1, 10]
+    for scale in scales:
+        times = {}
+        for name in VARIANTS:
+            times[name], peak = run(name, scale)
+            print(f"scale {scale:>3}, {name:>10}: {times[name]:6.2f}s, peak RSS {peak / 2**10:6.1f} MiB")
+        print(f"scale {scale:>3}: parseFile takes {times['parseFile'] / times['full parse'] * 100:.0f}% "
+              f"of the time of the full parse")
+
+
+if __name__ == "__main__":
+    main()
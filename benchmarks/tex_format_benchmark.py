@@ -0,0 +1,51 @@
+"""Compares pdflatex runs of a single-song document with the preamble loaded
+from the precompiled format (tex_format.py) and without it.
+
+The format is built (or taken from the cache) up front; then each variant runs
+one pdflatex pass of the document the given number of times.
+
+Usage: PYTHONPATH=.:src/latex python3 benchmarks/tex_format_benchmark.py [a4|a5] [repetitions] [song.xml]
+"""
+
+import glob
+import os
+import sys
+import tempfile
+import time
+
+import songbook2tex as sb2t
+import songs2tex
+from pdf_build import PdfBuild
+import src.lib.songbook as sb
+
+
+def measure(name, build, repetitions):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        build.pdflatex()
+    elapsed = (time.perf_counter() - start) / repetitions
+    print(f"{name:>14}: {elapsed:6.2f}s per pdflatex run")
+    return elapsed
+
+
+def main():
+    papersize = sys.argv[1] if len(sys.argv) > 1 else "a4"
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    song = sys.argv[3] if len(sys.argv) > 3 else sorted(glob.glob(os.path.join(sb.repo_dir(), "songs/pl/harc/*.xml")))[0]
+    with tempfile.TemporaryDirectory() as tex_dir, open(os.devnull, "w") as devnull:
+        tex_file = os.path.join(tex_dir, "song.tex")
+        with open(tex_file, "w", encoding="utf-8") as f:
+            sb2t.write_tex(songs2tex.single_tex([song], papersize, "Benchmark"), f)
+        with_format = PdfBuild(tex_file, "song", tex_dir, make_index=False, stdout=devnull)
+        if not with_format.format:
+            print("No precompiled format available (see the build cache directory)", file=sys.stderr)
+            exit(1)
+        plain = PdfBuild(tex_file, "song", tex_dir, make_index=False, stdout=devnull, use_format=False)
+        print(f"{song} ({papersize}), {repetitions} repetitions")
+        plain_time = measure("without format", plain, repetitions)
+        format_time = measure("with format", with_format, repetitions)
+        print(f"saved {plain_time - format_time:.2f}s ({(1 - format_time / plain_time) * 100:.0f}%) per run")
+
+
+if __name__ == "__main__":
+    main()
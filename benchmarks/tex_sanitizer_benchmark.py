@@ -0,0 +1,131 @@
+"""Compares throughput of the LaTeX text sanitization (tex_sanitizer) with the
+previous implementation: a regex compiled on every tex_escape() call, a chain
+of str.replace() calls and nine re.search() script checks per song.
+
+Every song of the corpus is rendered once (unsanitized) up front; then both
+implementations process the same texts and their results are compared.
+
+Usage: PYTHONPATH=.:src/latex python3 benchmarks/tex_sanitizer_benchmark.py [repetitions]
+"""
+
+import glob
+import os
+import re
+import sys
+import time
+
+import song2tex as s2t
+import src.lib.songbook as sb
+import src.lib.song_ir as song_ir
+import src.lib.tex_sanitizer as tex_sanitizer
+
+
+def legacy_tex_escape(text):
+    """
+        :param text: a plain text message
+        :return: the message escaped to appear correctly in LaTeX
+    """
+    conv = {
+        '&': r'\&',
+        '"': "''",
+        '%': r'\%',
+        '$': r'\$',
+        '#': r'\#',
+        '_': r'\_',
+        '{': r'\{',
+        '}': r'\}',
+        '~': r'\textasciitilde{}',
+        '^': r'\^{}',
+        '\\': r'\textbackslash{}',
+        '<': r'\textless{}',
+        '>': r'\textgreater{}',
+        '...': r'{\dots}'
+    }
+    if text:
+        regex = re.compile('|'.join(re.escape(str(key)) for key in sorted(conv.keys(), key=lambda item: - len(item))))
+        return regex.sub(lambda match: conv[match.group()], text)
+    else:
+        return text
+
+
+def legacy_sanitize(res):
+    res = (res.replace('﻿',' ').replace('😷','').replace('е','e').replace('\u200B','').replace('\u0096','').replace('\u0092','').replace('\u0095','').replace('\u0099','')
+           .replace('\u02B9','').replace('\u0092','').replace('\u0088','').replace('\u0085','').replace('\u0080','').replace('\u0081','').replace('\u0082','').replace('\u0087','').replace('\u0084','').replace('\u0093','').replace('\u0094','').replace('\u0091','').replace('\u0098','').replace('\u009B','')
+           .replace('\u2028','').replace('\u2005','').replace('\u2003','').replace('\u205F','').replace('\u009F','').replace('\u2502','')
+           .replace('\u25BC','$\\downarrow$').replace('\u25B2','$\\uparrow$').replace('🔼','$\\uparrow$').replace('⬆','$\\uparrow$')
+           .replace('️⬇','$\\downarrow$').replace('️⬇','$\\downarrow$').replace('️🔽','$\\downarrow$').replace('⬇','$\\downarrow$').replace('🔽','$\\downarrow$')
+           .replace('\u02bc','')
+           .replace('\uFFFD','').replace('\uFE0F','')
+           .replace('\u1E57','p')
+           .replace('\uFFFD','#')
+           .replace('\u009C','')
+           .replace('','')
+           .replace('\u99C9','')
+           .replace('\u2033','"').replace('\u2032',"'")
+           .replace('\u2075','').replace('\u2009','')
+           .replace('\u001E','').replace('\uFFFC','').replace('🙂','')
+           .replace('\u3164','')
+           .replace('\u001b','')
+           .replace('\u2212','-'))
+    if bool(re.search('[\u0400-\u04FF]', res)):
+        return ""
+    if bool(re.search('[\u5000-\u50FF]', res)):
+        return ""
+    if bool(re.search('[\u3000-\u30FF]', res)):
+        return ""
+    if bool(re.search('[\u8A00-\u8AFF]', res)):
+        return ""
+    if bool(re.search('[\u6600-\u66FF]', res)):
+        return ""
+    if bool(re.search('[\u2600-\u26FF]', res)):
+        return ""
+    if bool(re.search('[\u0300-\u03FF]', res)):
+        return ""
+    if bool(re.search('[\u0500-\u05FF]', res)):
+        return ""
+    if bool(re.search('[\u1000-\u10FF]', res)):
+        return ""
+    return res
+
+
+def texts_of(song):
+    """All strings of the song passed to tex_escape()"""
+    texts = [song.title, song.alias, song.text_author, song.composer, song.artist]
+    for block in song.blocks:
+        for row in block.rows:
+            texts.append(row.text)
+            for chord, text in row.chunks:
+                texts += [chord, text]
+    return [text for text in texts if text]
+
+
+def measure(name, function, inputs, repetitions):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        results = [function(text) for text in inputs]
+    elapsed = (time.perf_counter() - start) / repetitions
+    size = sum(len(text) for text in inputs)
+    print(f"{name:>20}: {elapsed * 1000:8.1f} ms, {size / elapsed / 2**20:7.1f} Mchars/s")
+    return results
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    files = sorted(glob.glob(os.path.join(sb.repo_dir(), "songs/**/*.xml"), recursive=True))
+    songs = [song_ir.parse_song(f) for f in files]
+    texts = [text for song in songs for text in texts_of(song)]
+    rendered = [s2t.template().render(song=s2t.Song.fromIR(song)) for song in songs]
+    print(f"{len(songs)} songs, {len(texts)} escaped strings, {sum(map(len, rendered))} rendered characters")
+
+    old = measure("legacy tex_escape", legacy_tex_escape, texts, repetitions)
+    new = measure("tex_escape", tex_sanitizer.tex_escape, texts, repetitions)
+    assert old == new, "tex_escape results differ"
+
+    old = measure("legacy sanitize", legacy_sanitize, rendered, repetitions)
+    new = measure("sanitize", tex_sanitizer.sanitize, rendered, repetitions)
+    assert old == ["" if reason else text for text, reason in new], "sanitize results differ"
+    print(f"{sum(1 for _, reason in new if reason)} songs dropped")
+
+
+if __name__ == "__main__":
+    main()
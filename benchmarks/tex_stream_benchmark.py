@@ -0,0 +1,59 @@
+"""Compares peak memory of writing a songbook's LaTeX as one string (the
+previous create_ready_tex(): the whole document joined, then printed) with
+streaming it chunk by chunk (songbook2tex.write_tex()).
+
+The synthetic songbook repeats every song of the default songbook N times
+(20 by default). Fragments come from a warmed-up fragment cache, rendered in
+this process, so that only the document assembly is compared.
+
+Usage: PYTHONPATH=.:src/latex python3 benchmarks/tex_stream_benchmark.py [N]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import song2tex as s2t
+import songbook2tex as sb2t
+import src.lib.songbook as sb
+
+
+def document(paths, stream):
+    header = sb2t.read_format("songbook_p.tex", {
+        "paper": "papera4", "fontsize": "19pt", "title": "Benchmark", "subtitle": "", "place": "",
+        "url": "", "publisher": "", "imagePdfPath": "",
+    })
+    footer = sb2t.read_format("songbook_s.tex")
+    if stream:
+        yield header
+        yield from s2t.iter_songs_tex(paths, jobs=1)
+        yield footer
+    else:
+        yield header + s2t.songs2tex(paths, jobs=1) + footer
+
+
+def measure(name, paths, stream):
+    with open(os.devnull, "w") as out:
+        tracemalloc.start()
+        start = time.perf_counter()
+        sb2t.write_tex(document(paths, stream), out)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(f"{name:>6}: peak {peak / 2**20:8.1f} MiB, {elapsed:6.2f}s")
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    songbook = sb.load_songbook_spec_from_yaml(os.path.join(sb.repo_dir(), "songbooks/default.songbook.yaml"))
+    files = [song.plik() for song in songbook.list_of_songs() if not song.is_alias()]
+    s2t.songs2tex(files, jobs=1)  # warm up the fragment cache
+    paths = files * scale
+    print(f"{len(files)} songs x {scale} = {len(paths)} songs")
+    measure("string", paths, stream=False)
+    measure("stream", paths, stream=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -40,6 +40,11 @@ class XmlRequest(BaseModel):
 
 CACHE_DIR = "/tmp/songbook_cache"
 os.makedirs(CACHE_DIR, exist_ok=True)
+# Build caches (song metadata, TeX fragments, ...) shared by all render jobs;
+# the render subprocesses inherit it through the environment.
+os.environ.setdefault("SONGBOOK_CACHE_DIR", "/tmp/songbook_build_cache")
+# Parse and render songs on all cores (see list_of_songs.default_jobs()).
+os.environ.setdefault("SONGBOOK_JOBS", "0")
 cache_locks = {}
 cache_locks_lock = threading.Lock()
 
@@ -19,6 +19,7 @@ if [[ $# -gt 1 ]]; then
   exit 1
 fi
 
+PYTHONPATH="${__dir}" python3 "${__dir}/src/compile_corpus.py"
 PYTHONPATH="${__dir}" python3 "${__dir}/src/html/htmls_generator.py"
 PYTHONPATH="${__dir}" python3 "${__dir}/src/html/index_generator.py"
 cd "${__dir}/build/"
@@ -24,7 +24,13 @@ fi
 
 tex_dir=${__dir}/build/songs_tex
 mkdir -p ${tex_dir}
-tex_file=$(realpath "${tex_dir}")/${RANDOM}${RANDOM}.tex
+# Every job has its own LaTeX file (and pdf_build.py its own scratch directory),
+# so any number of jobs can run in parallel.
+tex_file=$(mktemp "$(realpath "${tex_dir}")/.XXXXXXXX.tex")
+trap 'rm -f "${tex_file}"' EXIT
+
+# Render songbooks on all cores unless told otherwise (see list_of_songs.default_jobs()).
+export SONGBOOK_JOBS="${SONGBOOK_JOBS:-0}"
 
 MAKE_INDEX=true
 if [[ "${@: -1}" =~ \.yaml$ || $# -lt 4 ]]; then
@@ -43,21 +49,11 @@ else
   JOB=${JOB:-"output"}
 fi
 
-(cd ${tex_dir}; rm -rf "${JOB}.aind" "${JOB}.gind" "${JOB}.wind" "${JOB}.aadx" "${JOB}.gadx" "${JOB}.wadx")
-
-(
-  cd ${tex_dir}
-
-  # Run pdflatex three times to recalculate longtables and toc
-  TEXINPUTS=.:${__dir}/src/latex: pdflatex -no-shell-escape -jobname=${JOB} -output-directory "${tex_dir}" "${tex_file}"
-  INDEX_STY=()
-
-  if ${MAKE_INDEX}; then
-    (cd ${tex_dir}; texindy -M lang/polish/utf8-lang aliases.idx)
-    (cd ${tex_dir}; texindy -M lang/polish/utf8-lang -M ${__dir}/src/formats/no-lg genre.idx)
-    (cd ${tex_dir}; texindy -M lang/polish/utf8-lang -M ${__dir}/src/formats/no-lg wyk.idx)
-  fi
+INDEX_FLAG=()
+if ${MAKE_INDEX}; then
+  INDEX_FLAG=(--index)
+fi
 
-  TEXINPUTS=.:${__dir}/src/latex: pdflatex -no-shell-escape -jobname=${JOB} -output-directory "${tex_dir}" "${tex_file}"
-  TEXINPUTS=.:${__dir}/src/latex: pdflatex -no-shell-escape -jobname=${JOB} -output-directory "${tex_dir}" "${tex_file}"
-)
+# Runs pdflatex (and texindy) until the auxiliary files converge; they are kept
+# in ${tex_dir}/.aux, so a rebuild of the same job usually needs a single pass.
+PYTHONPATH="${__dir}" python3 ${__dir}/src/latex/pdf_build.py "${INDEX_FLAG[@]}" --jobname "${JOB}" --output-directory "${tex_dir}" "${tex_file}"
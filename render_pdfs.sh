@@ -1,7 +1,5 @@
 #!/bin/bash
 SCRIPT_DIR=$( cd -- "$( dirname -- "${BASH_SOURCE[0]}" )" &> /dev/null && pwd )
 
-for s in songbooks/*.yaml; do
-  ./render_pdf.sh a4 "${s}"
-  ./render_pdf.sh a5 "${s}"
-done
\ No newline at end of file
+# Renders a4 and a5 PDFs of all songbooks in parallel (songs are compiled once, up front)
+PYTHONPATH="${SCRIPT_DIR}" python3 ${SCRIPT_DIR}/src/render_scheduler.py --pdf "${@}"
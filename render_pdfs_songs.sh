@@ -8,6 +8,9 @@ SCRIPT_DIR=$( cd -- "$( dirname -- "${BASH_SOURCE[0]}" )" &> /dev/null && pwd )
 OUTPUT_DIR="${SCRIPT_DIR}/build/songs_pdf"
 mkdir -p "${OUTPUT_DIR}"
 
+# Compile songs once, so every job below skips XML parsing
+PYTHONPATH="${SCRIPT_DIR}" python3 ${SCRIPT_DIR}/src/compile_corpus.py
+
 if [ $# -eq 0 ]; then
   # No arguments provided, process all songs
   SONGS_LIST=( $(find songs -name "*.xml" -type f) )
@@ -16,6 +19,26 @@ else
   SONGS_LIST=( "$@" )
 fi
 
+# Keep only the songs whose PDFs are stale (this also removes the PDFs of deleted songs),
+# and record the rendered ones when done, even if some of them failed.
+SONGS_LIST=( $(PYTHONPATH="${SCRIPT_DIR}" python3 ${SCRIPT_DIR}/src/latex/songs_pdf_manifest.py stale "${OUTPUT_DIR}" "${SONGS_LIST[@]}") )
+RENDERED_LIST=( "${SONGS_LIST[@]}" )
+record_rendered() {
+  PYTHONPATH="${SCRIPT_DIR}" python3 ${SCRIPT_DIR}/src/latex/songs_pdf_manifest.py record "${OUTPUT_DIR}" "${RENDERED_LIST[@]}"
+}
+trap record_rendered EXIT
+
+# Compile all songs into one document per paper size and split it into per-song PDFs.
+# Songs which can't be split out are rendered one by one below (all of them without qpdf
+# or with SPLIT_SONGS=0).
+if [ ${#SONGS_LIST[@]} -gt 0 ] && [ "${SPLIT_SONGS:-1}" != 0 ] && command -v qpdf >/dev/null; then
+  FALLBACK_LIST=()
+  for format in a4 a5; do
+    FALLBACK_LIST+=( $(PYTHONPATH="${SCRIPT_DIR}" python3 ${SCRIPT_DIR}/src/latex/split_songs_pdf.py "${format}" "${OUTPUT_DIR}" "${SONGS_LIST[@]}") )
+  done
+  SONGS_LIST=( $(printf '%s\n' "${FALLBACK_LIST[@]}" | sort -u) )
+fi
+
 # Function to process a single song file
 process_song() {
   local song_file="$1"
@@ -38,4 +61,4 @@ export SCRIPT_DIR OUTPUT_DIR
 # You can set PARALLEL_JOBS environment variable to control concurrency
 PARALLEL_JOBS=${PARALLEL_JOBS:-8}
 
-printf '%s\n' "${SONGS_LIST[@]}"  | xargs -P "${PARALLEL_JOBS}" -I {} bash -c 'process_song "$@"' _ {}
+[ ${#SONGS_LIST[@]} -eq 0 ] || printf '%s\n' "${SONGS_LIST[@]}"  | xargs -P "${PARALLEL_JOBS}" -I {} bash -c 'process_song "$@"' _ {}
@@ -0,0 +1,23 @@
+"""Compiles (or incrementally refreshes) the binary bundle of all songs,
+    which the generators read instead of parsing the song XML files"""
+
+import logging
+import sys
+
+import src.lib.list_of_songs as loslib
+import src.lib.song_bundle as song_bundle
+import src.lib.songbook as sb
+
+logging.basicConfig(level=logging.INFO)
+
+def main():
+    if len(sys.argv) > 2:
+        print("Usage: python3 compile_corpus.py [corpus.bin]", file=sys.stderr)
+        exit(1)
+    path = sys.argv[1] if len(sys.argv) == 2 else song_bundle.default_bundle_path()
+    files = loslib.files_from_globs(["songs/**/*.xml"], sb.repo_dir())
+    song_bundle.compile_bundle(files, sb.repo_dir(), path)
+
+
+if __name__ == "__main__":
+    main()
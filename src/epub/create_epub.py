@@ -5,6 +5,7 @@ import sys
 
 from lxml import etree
 import shutil
+import tempfile
 from zipfile import ZipFile
 from datetime import datetime
 
@@ -300,11 +301,11 @@ def create_full_epub(songbook,  target_dir):
     files.extend(create_toc_xhtml(los, target_dir, page_suffix = suffix))
 
     artists = os.path.join(path_out, "_artists.xhtml")
-    aig.makeIndex("Wykonawcy", songbook.list_of_songs(), artists, lambda x:x.artist() if not x.is_alias() else None )
+    aig.makeIndex("Wykonawcy", los, artists, lambda x:x.artist() if not x.is_alias() else None )
     files.append("_artists.xhtml")
 
     genres = os.path.join(path_out, "_genres.xhtml")
-    aig.makeIndex("Gatunki", songbook.list_of_songs(), genres, lambda x:x.genre() if not x.is_alias() else None)
+    aig.makeIndex("Gatunki", los, genres, lambda x:x.genre() if not x.is_alias() else None)
     files.append("_genres.xhtml")
 
     create_content_opf(songbook, los, target_dir, post_files=files)
@@ -337,8 +338,15 @@ def main():
     songbook = sb.load_songbook_spec_from_yaml(songbook_file)
 
     # które piosenki chcę zawrzeć w śpiewniku (może być katalogiem z plikami xml lub listą plików)
-    create_full_epub(songbook, target_dir)
-    package_epub(songbook, target_dir, target_file=songbook.id()+".epub")
+    # Each songbook is assembled in its own directory, so several EPUBs can be rendered in parallel.
+    os.makedirs(target_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(dir=target_dir, prefix=f".epub_{songbook.id()}.")
+    try:
+        create_full_epub(songbook, work_dir)
+        package_epub(songbook, work_dir, target_file=songbook.id()+".epub")
+        os.replace(os.path.join(work_dir, songbook.id()+".epub"), os.path.join(target_dir, songbook.id()+".epub"))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,11 @@
 import os
+import sys
 import unicodedata
-import lib.read_song_xml as rsx
+
+# Add the repository root to the path to import existing modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import src.lib.read_song_xml as rsx
 
 path = "../songs"
 songs = os.listdir(path)
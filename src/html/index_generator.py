@@ -7,7 +7,7 @@ import logging
 
 # def name_of_file(song):
 #     return os.path.splitext(os.path.split(song)[1])[0]
-def create_index_html(list_of_songs_meta, target_dir):
+def create_index_html(list_of_songs_meta, target_dir, songbooks=None):
     tmp_path = 'index.html'
     out_path = os.path.join(target_dir, tmp_path)
     
@@ -164,7 +164,7 @@ def create_index_html(list_of_songs_meta, target_dir):
     ul = tree.getroot().find(".//ul[@id='songbooks']")
     if ul is None:
         ul = tree.getroot().find(".//{http://www.w3.org/1999/xhtml}ul[@id='songbooks']")
-    for songbook in sb.songbooks():
+    for songbook in (sb.songbooks() if songbooks is None else songbooks):
         if not songbook.hidden():
             li = etree.SubElement(ul, "li", attrib={"id": songbook.id()})
             li.text=songbook.title() + ":"
@@ -183,7 +183,7 @@ def create_index_html(list_of_songs_meta, target_dir):
     et.write(out_path, pretty_print=True, method='html', encoding='utf-8')
 
 
-def create_sitemap_xml(list_of_songs_meta, target_dir):
+def create_sitemap_xml(list_of_songs_meta, target_dir, songbooks=None):
     sitemap_path = os.path.join(target_dir, "sitemap.xml")
     root = etree.Element("urlset", xmlns="http://www.sitemaps.org/schemas/sitemap/0.9")
     base = "https://spiewaj.com/"
@@ -210,7 +210,7 @@ def create_sitemap_xml(list_of_songs_meta, target_dir):
             changefreq.text = "weekly"
 
 
-    for songbook in sb.songbooks():
+    for songbook in (sb.songbooks() if songbooks is None else songbooks):
         if not songbook.hidden():
             # https://spiewaj.com/dino.epub
             # https://spiewaj.com/songs_tex/dino_a5.pdf
@@ -228,8 +228,11 @@ def create_sitemap_xml(list_of_songs_meta, target_dir):
     tree.write(sitemap_path, pretty_print=True, xml_declaration=True, encoding='utf-8')
     logging.info(f"Sitemap created at {sitemap_path}")
 
-def create_index_json(list_of_songs_meta, target_dir):
-    """Create index.json with all songs and songbooks metadata"""
+def create_index_json(list_of_songs_meta, target_dir, songbooks=None, membership=None):
+    """Create index.json with all songs and songbooks metadata
+
+    With a SongbookMembership, every song lists the ids of the (not hidden) songbooks containing it.
+    """
     import json
     
     index_json_path = os.path.join(target_dir, "index.json")
@@ -259,6 +262,8 @@ def create_index_json(list_of_songs_meta, target_dir):
             song_data["lang"] = song.lang()
         if song.text_author():
             song_data["text_author"] = song.text_author()
+        if membership is not None:
+            song_data["songbooks"] = [songbook.id() for songbook in membership.songbooks_of(song) if not songbook.hidden()]
         
         # Add path relative to repo root for unambiguous matching
         if song.plik():
@@ -268,7 +273,7 @@ def create_index_json(list_of_songs_meta, target_dir):
     
     # Build songbooks list
     songbooks_data = []
-    for songbook in sb.songbooks():
+    for songbook in (sb.songbooks() if songbooks is None else songbooks):
         if not songbook.hidden():
             songbook_data = {
                 "id": songbook.id(),
@@ -306,14 +311,18 @@ def create_index_json(list_of_songs_meta, target_dir):
 
 def main():
     songbook_file = os.path.join(sb.repo_dir(), "songbooks/default.songbook.yaml") if len(sys.argv) == 1 else sys.argv[1]
-    songbook = sb.load_songbook_spec_from_yaml(songbook_file)
+    membership = sb.resolve_songbooks()
+    # Reuse the already loaded spec, so its songs are resolved together with other songbooks
+    songbook = next((s for s in membership.songbooks if s.specFile == os.path.abspath(songbook_file)), None) \
+        or sb.load_songbook_spec_from_yaml(songbook_file)
     target_dir = os.path.join(sb.repo_dir(), "build")
+    los = membership.songs_of(songbook)
 
-    logging.info(f"Generating HTML index in {target_dir} from songbook spec {songbook_file}, song count: {len(songbook.list_of_songs())}")
+    logging.info(f"Generating HTML index in {target_dir} from songbook spec {songbook_file}, song count: {len(los)}")
 
-    create_index_html(songbook.list_of_songs(), target_dir)
-    create_sitemap_xml(songbook.list_of_songs(), target_dir)
-    create_index_json(songbook.list_of_songs(), target_dir)
+    create_index_html(los, target_dir, membership.songbooks)
+    create_sitemap_xml(los, target_dir, membership.songbooks)
+    create_index_json(los, target_dir, membership.songbooks, membership)
 
     index_js_path =os.path.join(target_dir, "index.js")
     if os.path.exists(index_js_path):
@@ -183,8 +183,8 @@ class StandardHtmlConverter(SongConverter):
             span_content = etree.SubElement(div, "span", attrib={"class": "comment"})
             span_content.text = song.comment
 
-    def _detect_language(self, song, src_xml_path):
-        """Detect language from song metadata or XML file, returning (lang, lang_code) tuple"""
+    def _detect_language(self, song):
+        """Detect language from song metadata (lang, else xml:lang), returning (lang, lang_code) tuple"""
         lang = "pl-PL"
         lang_code = "pl"
         
@@ -195,16 +195,6 @@ class StandardHtmlConverter(SongConverter):
                 song_lang = getattr(song, attr)
                 break
         
-        # If still no lang found, try to read directly from XML file
-        if not song_lang:
-            try:
-                from lxml import etree as xml_etree
-                xml_tree = xml_etree.parse(src_xml_path)
-                xml_root = xml_tree.getroot()
-                song_lang = xml_root.get('lang') or xml_root.get('{http://www.w3.org/XML/1998/namespace}lang')
-            except:
-                pass
-        
         if song_lang:
             # Map language codes
             lang_map = {
@@ -228,7 +218,7 @@ class StandardHtmlConverter(SongConverter):
         song = rsx.parse_song_xml(src_xml_path)
         
         # Determine language from song metadata or default to Polish
-        lang, lang_code = self._detect_language(song, src_xml_path)
+        lang, lang_code = self._detect_language(song)
         
         root_html = etree.Element("html")
         root_html.attrib["lang"] = lang
@@ -6,10 +6,10 @@ import pathlib
 import unicodedata
 from collections import defaultdict
 
-# Add the lib directory to the path to import existing modules
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'lib'))
+# Add the repository root to the path to import existing modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
-from list_of_songs import list_of_song_from_globs
+from src.lib.list_of_songs import list_of_song_from_globs
 
 def create_genre_artist_index(songs_dir="songs", index_dir="songs-index"):
     """
@@ -0,0 +1,234 @@
+"""Builds a PDF from a LaTeX file, running pdflatex (and texindy) only as many
+times as needed.
+
+After every pdflatex pass the indexes whose .idx changed are regenerated by
+texindy, and the files LaTeX reads back in the next pass (.aux, .toc, .out and
+the .ind of the indexes) are checksummed. The build has converged when none of them
+changed during the pass - or when only the .aux changed and LaTeX asked for
+no rerun in its log.
+
+Every job is built in a scratch directory of its own (build_isolated()), so
+parallel jobs never share working files such as aliases.idx. The files read
+back are kept per job in <output dir>/.aux/<job>, and seed the next build of
+the same job, which then usually converges after a single pass. The PDF is
+moved into the output directory atomically.
+
+The preamble is loaded from a precompiled format (see tex_format.py) unless
+--no-format is given; if pdflatex fails with the format, it runs without it.
+
+Usage: python3 src/latex/pdf_build.py [--index] [--no-format] --jobname JOB --output-directory DIR TEX_FILE
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import tex_format
+
+LATEX_DIR = os.path.dirname(os.path.abspath(__file__))
+FORMATS_DIR = os.path.join(os.path.dirname(LATEX_DIR), "formats")
+
+# Indexes of the songbook (see src/formats/songbook_p.tex) and the xindy modules to sort them.
+INDEXES = {
+    "aliases": ["lang/polish/utf8-lang"],
+    "genre": ["lang/polish/utf8-lang", os.path.join(FORMATS_DIR, "no-lg")],
+    "wyk": ["lang/polish/utf8-lang", os.path.join(FORMATS_DIR, "no-lg")],
+}
+
+MAX_PASSES = 5
+
+# Warnings of LaTeX and packages (longtable, hyperref, ...) asking for another pass.
+_RERUN_RE = re.compile(rb"Rerun|rerun LaTeX")
+
+
+def file_digest(path):
+    """SHA-1 of the file's content, or None if it doesn't exist"""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+class PdfBuild:
+    """pdflatex build of one job in an output directory"""
+
+    def __init__(self, tex_file, jobname, output_dir, make_index=True, stdout=None,
+                 use_format=True):
+        """
+        Args:
+            tex_file: LaTeX document to compile
+            jobname: Name of the PDF and auxiliary files (<jobname>.pdf, <jobname>.aux, ...)
+            output_dir: Directory of the PDF and auxiliary files, kept between builds
+            make_index: Whether to generate the INDEXES
+            stdout: Where the output of pdflatex goes (stdout by default)
+            use_format: Whether to load the preamble from a precompiled format
+        """
+        self.tex_file = os.path.abspath(tex_file)
+        self.jobname = jobname
+        self.output_dir = os.path.abspath(output_dir)
+        self.indexes = INDEXES if make_index else {}
+        self.stdout = stdout
+        self.env = dict(os.environ, TEXINPUTS=f".:{LATEX_DIR}:", TEXFORMATS=tex_format.format_dir() + ":")
+        self.format = tex_format.prepare_format(self.tex_file, self.env, stdout) if use_format else None
+
+    def _path(self, name):
+        return os.path.join(self.output_dir, name)
+
+    def read_back_files(self):
+        """Files written by pdflatex or the index generation which the next pass reads"""
+        files = [self.jobname + ext for ext in (".aux", ".toc", ".out")]
+        return files + [name + ".ind" for name in self.indexes]
+
+    def digests(self):
+        return {name: file_digest(self._path(name)) for name in self.read_back_files()}
+
+    def pdflatex(self):
+        command = ["pdflatex", "-no-shell-escape", f"-jobname={self.jobname}", "-output-directory", self.output_dir]
+        if self.format:
+            try:
+                subprocess.run(command + [f"-fmt={self.format}", self.tex_file],
+                               cwd=self.output_dir, env=self.env, stdout=self.stdout, check=True)
+                return
+            except subprocess.CalledProcessError:
+                print(f"pdflatex failed with format {self.format}, running it without the format", file=sys.stderr)
+                self.format = None
+        subprocess.run(command + [self.tex_file], cwd=self.output_dir, env=self.env, stdout=self.stdout, check=True)
+
+    def rerun_requested(self):
+        try:
+            with open(self._path(self.jobname + ".log"), "rb") as f:
+                return bool(_RERUN_RE.search(f.read()))
+        except FileNotFoundError:
+            return True
+
+    def _state_path(self):
+        return self._path(self.jobname + ".indexes.json")
+
+    def update_indexes(self):
+        """Runs texindy for the indexes whose .idx changed since their .ind was generated
+
+        Returns:
+            Names of the regenerated indexes
+        """
+        try:
+            with open(self._state_path()) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        updated = []
+        for name, modules in self.indexes.items():
+            idx = file_digest(self._path(name + ".idx"))
+            if idx is None:
+                # E.g. \makeindex dumped into the format, which can't keep the .idx open.
+                raise RuntimeError(f"pdflatex wrote no {name}.idx, the {name} index would be missing")
+            # The .ind is checked too: other jobs in the same directory write indexes of the same names.
+            if state.get(name) == [idx, file_digest(self._path(name + ".ind"))]:
+                continue
+            command = ["texindy"]
+            for module in modules:
+                command += ["-M", module]
+            subprocess.run(command + [name + ".idx"], cwd=self.output_dir, env=self.env, stdout=self.stdout,
+                           check=True)
+            state[name] = [idx, file_digest(self._path(name + ".ind"))]
+            updated.append(name)
+        with open(self._state_path(), "w") as f:
+            json.dump(state, f)
+        return updated
+
+    def run(self, max_passes=MAX_PASSES):
+        """Runs passes until the build converges (at most max_passes), reporting each pass on stderr
+
+        Returns:
+            Number of passes run
+        """
+        before = self.digests()
+        for n in range(1, max_passes + 1):
+            start = time.perf_counter()
+            self.pdflatex()
+            latex_time = time.perf_counter() - start
+            start = time.perf_counter()
+            updated = self.update_indexes()
+            index_time = time.perf_counter() - start
+            after = self.digests()
+            changed = [name for name in after if after[name] != before[name]]
+            print(f"Pass {n}: pdflatex {latex_time:.1f}s, indexes {index_time:.1f}s "
+                  f"({', '.join(updated) or 'no indexes'} regenerated); "
+                  f"changed: {', '.join(changed) or 'nothing'}", file=sys.stderr)
+            aux = self.jobname + ".aux"
+            if not changed or (changed == [aux] and not self.rerun_requested()):
+                print(f"{self.jobname}: converged after pass {n}", file=sys.stderr)
+                return n
+            before = after
+        print(f"{self.jobname}: not converged after {max_passes} passes", file=sys.stderr)
+        return max_passes
+
+
+def state_dir(output_dir, jobname):
+    """Directory keeping the auxiliary files of the job between builds"""
+    return os.path.join(output_dir, ".aux", jobname)
+
+
+def build_isolated(tex_file, jobname, output_dir, max_passes=MAX_PASSES, **options):
+    """Builds <output_dir>/<jobname>.pdf in a scratch directory, removed afterwards
+
+    The scratch directory starts with the auxiliary files saved by the job's
+    previous build (see state_dir()), and they are saved back when the build
+    succeeds. Only complete PDFs are moved into output_dir.
+
+    Args:
+        options: Options of PdfBuild
+
+    Returns:
+        Number of passes run
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    saved = state_dir(output_dir, jobname)
+    # In output_dir, so that files are moved out of it by renaming.
+    scratch = tempfile.mkdtemp(dir=output_dir, prefix=f".{jobname}.")
+    try:
+        build = PdfBuild(tex_file, jobname, scratch, **options)
+        state_files = build.read_back_files() + [os.path.basename(build._state_path())]
+        for name in state_files:
+            if os.path.exists(os.path.join(saved, name)):
+                shutil.copy2(os.path.join(saved, name), scratch)
+        passes = build.run(max_passes)
+        os.makedirs(saved, exist_ok=True)
+        for name in state_files:
+            if os.path.exists(os.path.join(scratch, name)):
+                os.replace(os.path.join(scratch, name), os.path.join(saved, name))
+        os.replace(os.path.join(scratch, jobname + ".pdf"), os.path.join(output_dir, jobname + ".pdf"))
+        return passes
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a PDF, rerunning pdflatex and the indexes until converged")
+    parser.add_argument("--jobname", required=True, help="Name of the PDF and auxiliary files")
+    parser.add_argument("--output-directory", required=True, help="Directory of the PDF (and of the saved auxiliary files)")
+    parser.add_argument("--index", action="store_true", help="Generate the indexes with texindy")
+    parser.add_argument("--no-format", action="store_true", help="Don't load the preamble from a precompiled format")
+    parser.add_argument("--max-passes", type=int, default=MAX_PASSES)
+    parser.add_argument("tex_file")
+    args = parser.parse_args()
+    try:
+        build_isolated(args.tex_file, args.jobname, args.output_directory, args.max_passes, make_index=args.index,
+                       use_format=not args.no_format)
+    except subprocess.CalledProcessError as e:
+        print(f"{e.cmd[0]} failed with exit code {e.returncode}", file=sys.stderr)
+        exit(e.returncode)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
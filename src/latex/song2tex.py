@@ -1,43 +1,26 @@
 # noinspection PyInterpreter
-from lxml import etree
 from enum import Enum
+import os
 import traceback
+from concurrent.futures import ProcessPoolExecutor
 import sys
 import jinja2
-import re
 
+import src.lib.list_of_songs as loslib
+import src.lib.song_ir as song_ir
+import src.lib.tex_sanitizer as tex_sanitizer
+from src.lib.tex_fragment_cache import TexFragmentCache
+from src.lib.tex_sanitizer import sanitize, tex_escape
 
-def tex_escape(text):
-    """
-        :param text: a plain text message
-        :return: the message escaped to appear correctly in LaTeX
-    """
-    conv = {
-        '&': r'\&',
-        '"': "''",
-        '%': r'\%',
-        '$': r'\$',
-        '#': r'\#',
-        '_': r'\_',
-        '{': r'\{',
-        '}': r'\}',
-        '~': r'\textasciitilde{}',
-        '^': r'\^{}',
-        '\\': r'\textbackslash{}',
-        '<': r'\textless{}',
-        '>': r'\textgreater{}',
-        '...': r'{\dots}'
-    }
-    if text:
-        regex = re.compile('|'.join(re.escape(str(key)) for key in sorted(conv.keys(), key=lambda item: - len(item))))
-        return regex.sub(lambda match: conv[match.group()], text)
-    else:
-        return text
 
+# The models below use __slots__, as whole parsed corpora may be kept in memory.
+# Chords repeat a lot, so they are interned.
 
 class RowChunk:
+    __slots__ = ('chord', 'content')
+
     def __init__(self, chord='', content=None):
-        self.chord = chord
+        self.chord = sys.intern(chord)
         if content is None:
             self.content = ''
         else:
@@ -54,6 +37,8 @@ class RowType(Enum):
 
 
 class Row:
+    __slots__ = ('row_type', 'new_chords', 'chunks', 'bis', 'instr', 'sidechords')
+
     def __init__(self, row_type='', new_chords=False, bis=False, chunks=[], instr=False, sidechords=None):
         self.row_type = row_type
         self.new_chords = new_chords
@@ -63,30 +48,47 @@ class Row:
         self.sidechords = sidechords
 
     @staticmethod
-    def parseDOM(root, bis=False):
+    def fromIR(row):
         try:
-            if root.text:
-                chunks = [RowChunk(content=tex_escape(root.text))]
+            if row.text:
+                chunks = [RowChunk(content=tex_escape(row.text))]
             else:
                 chunks = []
-            for chunk in root.getchildren():
-                chunks.append(RowChunk(chord=tex_escape(chunk.attrib['a']), content=tex_escape(chunk.tail)))
+            for chord, text in row.chunks:
+                chunks.append(RowChunk(chord=tex_escape(chord), content=tex_escape(text)))
             if len(chunks) > 0 and not (chunks[0].content.startswith(' ')):
                 chunks[0].content = ' ' + chunks[0].content
 
-            instr = root.attrib.get('style', 'normal') == 'instr'
-            r = Row(new_chords=(root.attrib.get('important_over', 'false')=='true'), bis=bis, chunks=chunks, instr=instr, sidechords=root.attrib.get('sidechords', None))
-            if instr:
+            r = Row(new_chords=row.important_over, bis=row.bis, chunks=chunks, instr=row.instr, sidechords=row.sidechords)
+            if row.instr:
                 r.row_type += RowType.INSTRUMENTAL.value
             return r
         except:
-            print("ERROR in ROW: " + str(root), file=sys.stderr)
+            print("ERROR in ROW: " + str(row.text), file=sys.stderr)
             raise
 
     def clone(self):
         return Row(row_type=self.row_type, new_chords=self.new_chords, bis=self.bis, chunks=self.chunks[:], instr=self.instr, sidechords=self.sidechords)
 
 
+class LinkedRow:
+    """Row of a linked block: the row of the referenced block, without new chords"""
+    __slots__ = ('row',)
+
+    new_chords = False
+
+    def __init__(self, row):
+        self.row = row
+
+    def __getattr__(self, name):
+        return getattr(self.row, name)
+
+    def clone(self):
+        row = self.row.clone()
+        row.new_chords = False
+        return row
+
+
 class BlockType(Enum):
     VERSE = 'V'
     CHORUS = 'C'
@@ -102,32 +104,32 @@ class BlockType(Enum):
 
 
 class Block:
+    __slots__ = ('block_type', 'rows', 'effective_rows')
+
     def __init__(self, block_type=BlockType.VERSE, rows=[], effective_rows=[]):
         self.block_type = block_type
         self.rows = rows
         self.effective_rows = effective_rows
     
     @staticmethod
-    def parseDOM(root, linked=False):
-        block_type = BlockType.parse(root.attrib['type'])
-        rows = []
-        for child in root.getchildren():
-            if child.tag == '{http://21wdh.staszic.waw.pl}bis':
-                bis_rows = [Row.parseDOM(row, bis=True) for row in child.findall('{*}row')]
-                bis_times = int(child.attrib.get('times', '2'))
-                bis_rows[-1].bis = bis_times
-                rows += bis_rows
-            else:
-                rows.append(Row.parseDOM(child))
+    def rowsFromIR(rows_ir):
+        rows = [Row.fromIR(row) for row in rows_ir]
         if len(rows) > 0:
             rows[0].row_type += RowType.FIRST.value
             rows[-1].row_type += RowType.LAST.value
         if len(rows) >= 2:
             rows[-2].row_type += RowType.LAST_BUT_ONE.value
+        return rows
+
+    @staticmethod
+    def fromIR(block, rows=None):
+        """Block of the BlockIR. Linked blocks only wrap the rows (from rowsFromIR), which can be shared."""
+        block_type = BlockType.parse(block.block_type)
+        if rows is None:
+            rows = Block.rowsFromIR(block.rows)
         effective_rows=[]
-        if linked:
-            for row in rows:
-                row.new_chords = False
+        if block.linked:
+            rows = [LinkedRow(row) for row in rows]
             for row in rows:
                 if not(RowType.INSTRUMENTAL.value in row.row_type):
                   if len(effective_rows) == 0:
@@ -135,7 +137,7 @@ class Block:
                     rowclone.row_type=RowType.FIRST.value + RowType.LAST.value + RowType.SHORT.value
                     effective_rows = [rowclone]
                   else:
-                    effective_rows[0].chunks.append(RowChunk(content=" \dots"))
+                    effective_rows[0].chunks.append(RowChunk(content=r" \dots"))
                     effective_rows[0].bis=False
                     effective_rows[0].sidechords=""
                     break
@@ -151,6 +153,8 @@ def make_one_line(s):
 
 
 class Song:
+    __slots__ = ('title', 'text_author', 'composer', 'artist', 'blocks', 'barre', 'metre', 'genre', 'alias')
+
     def __init__(self, title='', text_author='', composer='', artist='', blocks=[], barre=None, metre=None, genre=None, alias=None):
         self.title = make_one_line(tex_escape(title)) if title else ''
         self.text_author = make_one_line(tex_escape(text_author)) if text_author else ''
@@ -163,94 +167,198 @@ class Song:
         self.alias = make_one_line(tex_escape(alias))
 
     @staticmethod
-    def parseDOM(root):
-        # A child of 'lyric' element may either be a text block, a reference to a text block (e.g. to a chorus), or a tablature.
-        text_blocks = root.findall('{*}lyric/{*}block')
-        flatten = lambda block: Block.parseDOM(block) if 'blocknb' not in block.attrib else Block.parseDOM(
-            text_blocks[int(block.attrib['blocknb']) - 1], linked=True)
-        blocks = [flatten(block) for block in root.find('{*}lyric').getchildren() if
-                  block.tag != '{http://21wdh.staszic.waw.pl}tabbs']
-        get_text = lambda elem: elem.text if elem is not None else None
-        get_attrib = lambda attrs: attrs[0] if len(attrs)>0 and attrs[0] else None
+    def fromIR(song):
+        # Every distinct block (and linked view of it) is built once, and rows are shared between them.
+        rows = {}
+        views = {}
+
+        def block_view(block):
+            if (id(block.rows), block.linked) not in views:
+                if id(block.rows) not in rows:
+                    rows[id(block.rows)] = Block.rowsFromIR(block.rows)
+                views[id(block.rows), block.linked] = Block.fromIR(block, rows[id(block.rows)])
+            return views[id(block.rows), block.linked]
+
+        blocks = [block_view(block) for block in song.blocks]
         if blocks and blocks[-1].effective_rows:
-          blocks[-1].effective_rows[-1].row_type += RowType.END.value # end row
+          # The last row is shared with other blocks, so the end row is a copy.
+          last = blocks[-1]
+          end_row = last.effective_rows[-1].clone()
+          end_row.row_type += RowType.END.value # end row
+          blocks[-1] = Block(block_type=last.block_type, rows=last.rows, effective_rows=last.effective_rows[:-1] + [end_row])
 
         return Song(
-            title=root.get('title'),
-            alias=get_text(root.find('{*}alias')),
-            text_author=get_text(root.find('{*}text_author')),
-            composer=get_text(root.find('{*}composer')),
-            artist=get_text(root.find('{*}artist')),
+            title=song.title,
+            alias=song.alias,
+            text_author=song.text_author,
+            composer=song.composer,
+            artist=song.artist,
             blocks=blocks,
-            barre=get_attrib(root.xpath("./s:music/s:guitar/@barre", namespaces={"s": "http://21wdh.staszic.waw.pl"})),
-            metre=get_attrib(root.xpath("./s:music/@metre", namespaces={"s": "http://21wdh.staszic.waw.pl"})),
-            genre=get_text(root.find('{*}genre'))
+            barre=song.barre if song.barre else None,
+            metre=song.metre if song.metre else None,
+            genre=song.genre
         )
 
+    @staticmethod
+    def parseDOM(root):
+        return Song.fromIR(song_ir.SongIR.parseDOM(root))
 
-def song2tex(path):
-    try:
-        tree = etree.parse(path)
-        song = Song.parseDOM(tree.getroot())
 
-        latex_jinja_env = jinja2.Environment(
-            block_start_string='\BLOCK{',
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_environment = None
+
+def environment():
+    """Process-wide Jinja environment for the LaTeX templates, created on first use.
+
+    Compiled templates are kept in a bytecode cache under the build cache
+    directory (see list_of_songs.default_cache_dir()), when it is writable.
+    """
+    global _environment
+    if _environment is None:
+        bytecode_cache = None
+        cache_dir = os.path.join(loslib.default_cache_dir(), "jinja")
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            bytecode_cache = jinja2.FileSystemBytecodeCache(cache_dir)
+        except OSError as e:
+            print(f"Jinja bytecode cache disabled: {e}", file=sys.stderr)
+        _environment = jinja2.Environment(
+            block_start_string='\\BLOCK{',
             block_end_string='}',
-            variable_start_string='\VAR{',
+            variable_start_string='\\VAR{',
             variable_end_string='}',
-            comment_start_string='\#{',
+            comment_start_string='\\#{',
             comment_end_string='}',
             line_statement_prefix='%%',
             line_comment_prefix='%#',
             trim_blocks=True,
             lstrip_blocks=True,
             autoescape=False,
-            loader=jinja2.FileSystemLoader(sys.path[0])
+            loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
+            bytecode_cache=bytecode_cache,
+            auto_reload=False
         )
-        template = latex_jinja_env.get_template('song_template.tex')
-        res = template.render(song=song)
-        res = (res.replace('﻿',' ').replace('😷','').replace('е','e').replace('\u200B','').replace('\u0096','').replace('\u0092','').replace('\u0095','').replace('\u0099','')
-               .replace('\u02B9','').replace('\u0092','').replace('\u0088','').replace('\u0085','').replace('\u0080','').replace('\u0081','').replace('\u0082','').replace('\u0087','').replace('\u0084','').replace('\u0093','').replace('\u0094','').replace('\u0091','').replace('\u0098','').replace('\u009B','')
-               .replace('\u2028','').replace('\u2005','').replace('\u2003','').replace('\u205F','').replace('\u009F','').replace('\u2502','')
-               .replace('\u25BC','$\\downarrow$').replace('\u25B2','$\\uparrow$').replace('🔼','$\\uparrow$').replace('⬆','$\\uparrow$')
-               .replace('️⬇','$\\downarrow$').replace('️⬇','$\\downarrow$').replace('️🔽','$\\downarrow$').replace('⬇','$\\downarrow$').replace('🔽','$\\downarrow$')
-               .replace('\u02bc','')
-               .replace('\uFFFD','').replace('\uFE0F','')
-               .replace('\u1E57','p')
-               .replace('\uFFFD','#')
-               .replace('\u009C','')
-               .replace('','')
-               .replace('\u99C9','')
-               .replace('\u2033','"').replace('\u2032',"'")
-               .replace('\u2075','').replace('\u2009','')
-               .replace('\u001E','').replace('\uFFFC','').replace('🙂','')
-               .replace('\u3164','')
-               .replace('\u001b','')
-               .replace('\u2212','-'))
-        if bool(re.search('[\u0400-\u04FF]', res)):
-            return ""
-        if bool(re.search('[\u5000-\u50FF]', res)):
-            return ""
-        if bool(re.search('[\u3000-\u30FF]', res)):
-            return ""
-        if bool(re.search('[\u8A00-\u8AFF]', res)):
-            return ""
-        if bool(re.search('[\u6600-\u66FF]', res)):
-            return ""
-        if bool(re.search('[\u2600-\u26FF]', res)):
-            return ""
-        if bool(re.search('[\u0300-\u03FF]', res)):
-            return ""
-        if bool(re.search('[\u0500-\u05FF]', res)):
-            return ""
-        if bool(re.search('[\u1000-\u10FF]', res)):
-            return ""
-        return res
+    return _environment
+
+
+def template():
+    """Compiled song_template.tex"""
+    return environment().get_template('song_template.tex')
+
+
+def render_song_tex(path):
+    """Renders the song file into LaTeX.
+
+    Returns:
+        (LaTeX of the song, None), or ("", reason) if the song had to be dropped
+    """
+    try:
+        song = Song.fromIR(song_ir.load_song(path))
+        res, problem = sanitize(template().render(song=song))
+        if problem:
+            return "", problem
+        return res, None
     except Exception as e:
-        print(path, file=sys.stderr)
-        print(e, file=sys.stderr)
-        traceback.print_exc()
-        return ""
+        return "", f"{e!r}\n{traceback.format_exc()}"
+
+
+_fragment_cache = None
+
+def fragment_cache():
+    """Process-wide TexFragmentCache under the build cache directory, created on first use"""
+    global _fragment_cache
+    if _fragment_cache is None:
+        inputs = [__file__, os.path.join(TEMPLATE_DIR, 'song_template.tex'), tex_sanitizer.__file__, song_ir.__file__]
+        _fragment_cache = TexFragmentCache(os.path.join(loslib.default_cache_dir(), "tex"), inputs,
+                                           versions=["jinja2 " + jinja2.__version__])
+    return _fragment_cache
+
+
+def song2tex(path, cache=True):
+    """LaTeX of the song file ("" if it had to be dropped), taken from the fragment cache if possible"""
+    key = None
+    if cache:
+        key = fragment_cache().key(path)
+        res = fragment_cache().get(key)
+        if res is not None:
+            return res
+    res, problem = render_song_tex(path)
+    if problem:
+        print(f"Dropped song {path}: {problem}", file=sys.stderr)
+    elif key:
+        fragment_cache().put(key, res)
+    return res
+
+
+def render_songs_tex(paths):
+    """render_song_tex() of each file, keeping the order of files"""
+    return [render_song_tex(path) for path in paths]
+
+
+# Below this many songs a process pool costs more than it saves.
+MIN_SONGS_PER_JOB = 16
+
+def iter_render_songs_tex(paths, jobs):
+    """Yields render_song_tex() of each file in order, spreading chunks of files over a pool of jobs processes."""
+    jobs = min(jobs, len(paths) // MIN_SONGS_PER_JOB)
+    if jobs <= 1:
+        yield from (render_song_tex(path) for path in paths)
+        return
+    # A few chunks per worker evens out differences in song sizes.
+    chunk_size = -(-len(paths) // (jobs * 4))
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # map() yields results in the order of chunks, so fragments keep the songbook order.
+        for chunk in pool.map(render_songs_tex, chunks):
+            yield from chunk
+
+
+def dropped_songs_report(dropped, total):
+    """Report of the songs which had to be dropped, given as (path, reason) pairs"""
+    lines = [f"Dropped {len(dropped)} of {total} songs:"]
+    for path, problem in dropped:
+        lines.append(f"  {path}: {problem}")
+    return "\n".join(lines)
+
+
+def iter_songs_tex(paths, cache=True, jobs=None):
+    """Yields the LaTeX of each song file, in order ("" for dropped songs).
+
+    Songs missing in the fragment cache are rendered by jobs processes (defaults
+    to list_of_songs.default_jobs()) while cached fragments are read one at a
+    time, so the LaTeX of all songs is never held in memory at once. Dropped
+    songs are reported once, at the end.
+    """
+    if jobs is None:
+        jobs = loslib.default_jobs()
+    paths = list(paths)
+    keys = [fragment_cache().key(path) for path in paths] if cache else [None] * len(paths)
+    missing = fragment_cache().missing(keys) if cache else range(len(paths))
+    rendered = iter_render_songs_tex([paths[i] for i in missing], jobs)
+    missing = set(missing)
+    dropped = []
+    for i, (path, key) in enumerate(zip(paths, keys)):
+        res = None if i in missing else fragment_cache().get(key)
+        if res is None:
+            # A fragment removed since missing() was called is rendered here.
+            res, problem = next(rendered) if i in missing else render_song_tex(path)
+            if problem:
+                dropped.append((path, problem))
+            elif key:
+                fragment_cache().put(key, res)
+        yield res
+    if dropped:
+        print(dropped_songs_report(dropped, len(paths)), file=sys.stderr)
+    if cache:
+        fragment_cache().prune()
+        print(fragment_cache(), file=sys.stderr)
+
+
+def songs2tex(paths, cache=True, jobs=None):
+    """LaTeX of all the song files, in order (see iter_songs_tex())"""
+    return "".join(iter_songs_tex(paths, cache=cache, jobs=jobs))
+
 
 def main():
     if len(sys.argv) < 2:
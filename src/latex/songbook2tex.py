@@ -2,6 +2,7 @@
     and gives tex text on stdout"""
 
 import os
+import re
 import sys
 
 import song2tex as s2t
@@ -14,12 +15,34 @@ logger = logging.getLogger(__name__)
 def str2tex(s):
     return s.replace("\n", "\\\\").replace("#", "\\#").replace("_", "\\_").replace("...", "…")
 
-def create_ready_tex(songbook, papersize):
-    """function create a pdf file in a4 or a5 size
-        source - one file or list of files or directory path
-        size - A4 or A5
-        title - if source is list of songs you can add a title of songbook,
-        songbook - Specification of the songbook to generate
+def fill_placeholders(text, values):
+    """Replaces the :name: placeholders of the values in the text, in one pass"""
+    pattern = re.compile("|".join(re.escape(f":{name}:") for name in values))
+    return pattern.sub(lambda match: values[match.group()[1:-1]], text)
+
+
+def read_format(name, values=None):
+    """Content of src/formats/<name>, with the placeholders of values filled in"""
+    with open(os.path.join("src/formats", name)) as f:
+        content = f.read()
+    return fill_placeholders(content, values) if values else content
+
+
+def write_tex(chunks, out=None):
+    """Writes the LaTeX chunks (e.g. of songbook_tex()) one by one to the file or pipe (stdout by default)"""
+    out = out or sys.stdout
+    for chunk in chunks:
+        out.write(chunk)
+    # print() of the whole document used to add the final newline.
+    out.write("\n")
+
+
+def songbook_tex(songbook, papersize):
+    """Yields the LaTeX of the songbook in chunks: header, each song and footer
+
+    Args:
+        songbook: Specification of the songbook to generate
+        papersize: a4 or a5
     """
     source = songbook.list_of_songs()
 
@@ -35,34 +58,36 @@ def create_ready_tex(songbook, papersize):
         print("Wrong size of paper!", file=sys.stderr)
         exit(1)
 
-    head = f"songbook_p.tex"
-    foot = f"songbook_s.tex"
-
-    with open("src/formats/" + head) as f:
-        content = f.read()
-
-    content = (content
-               .replace(":paper:", "paper" + papersize)
-               .replace(":fontsize:", "19pt" if papersize == "a4" else "14pt")
-               .replace(":title:", str2tex(songbook.title()))
-               .replace(":subtitle:", str2tex(songbook.subtitle()))
-               .replace(":place:", str2tex(songbook.place() + ", ") if songbook.place() else "")
-               .replace(":url:", str2tex(songbook.url()))
-               .replace(":publisher:", str2tex(songbook.publisher())))
-
     if songbook.imagePdfPath():
         image_tex = f"\\includegraphics[height=5 cm]{{{songbook.imagePdfPath()}}}"
     else:
         image_tex = ""
-        
-    content = content.replace(":imagePdfPath:", image_tex)
 
-    content += "".join([s2t.song2tex(file) for _, file in list_title_file])
+    yield read_format("songbook_p.tex", {
+        "paper": "paper" + papersize,
+        "fontsize": "19pt" if papersize == "a4" else "14pt",
+        "title": str2tex(songbook.title()),
+        "subtitle": str2tex(songbook.subtitle()),
+        "place": str2tex(songbook.place() + ", ") if songbook.place() else "",
+        "url": str2tex(songbook.url()),
+        "publisher": str2tex(songbook.publisher()),
+        "imagePdfPath": image_tex,
+    })
 
-    with open("src/formats/" + foot) as f:
-        content += f.read()
+    yield from s2t.iter_songs_tex([file for _, file in list_title_file])
 
-    return print(content)
+    yield read_format("songbook_s.tex")
+
+
+def create_ready_tex(songbook, papersize, out=None):
+    """Writes the LaTeX of the songbook to out (stdout by default), streaming song by song
+
+    Args:
+        songbook: Specification of the songbook to generate
+        papersize: a4 or a5
+        out: File or pipe to write to, e.g. stdin of pdflatex
+    """
+    write_tex(songbook_tex(songbook, papersize), out)
 
 
 def main():
@@ -9,12 +9,46 @@ import src.lib.songbook as sb
 import songbook2tex as sb2t
 
 
-def create_ready_tex(songbook, source, papersize, title_of_songbook=None):
-    """function create a pdf file in a4 or a5 size
+def single_tex(source, papersize, title_of_songbook):
+    """Yields the LaTeX of the songs without songbook decorations, in chunks: header, each song and footer"""
+    yield sb2t.read_format("single_p.tex", {
+        "title": title_of_songbook,
+        "paper": "paper" + papersize,
+        "fontsize": "19pt" if papersize == "a4" else "14pt",
+    })
+
+    yield from s2t.iter_songs_tex(source)
+
+    yield sb2t.read_format("single_s.tex")
+
+
+def split_tex(source, papersize):
+    """Yields the LaTeX of the songs in the single layout, to be split into PDFs of single songs.
+
+    Every song starts on an odd page numbered 1, as in its own document, and
+    sets \\SongId to its index in source, so that its pages are marked in the
+    .aux file (see split_songs_pdf.py).
+    """
+    yield sb2t.read_format("single_p.tex", {
+        "title": "",
+        "paper": "paper" + papersize,
+        "fontsize": "19pt" if papersize == "a4" else "14pt",
+    })
+
+    for i, fragment in enumerate(s2t.iter_songs_tex(source)):
+        yield f"\\cleardoublepage\\setcounter{{page}}{{1}}\\renewcommand{{\\SongId}}{{{i}}}\n"
+        yield fragment
+
+    yield sb2t.read_format("single_s.tex")
+
+
+def create_ready_tex(songbook, source, papersize, title_of_songbook=None, out=None):
+    """function writes the LaTeX of a pdf file in a4 or a5 size to out (stdout by default)
         source - one file or list of files or directory path
         size - A4 or A5
         title - if source is list of songs you can add a title of songbook,
         songbook - True if we want songbook, False if we don't
+        out - file or pipe to write to, e.g. stdin of pdflatex
     """
 
     if papersize not in ("a4", "a5"):
@@ -29,25 +63,9 @@ def create_ready_tex(songbook, source, papersize, title_of_songbook=None):
         songbook = sb.load_songbook_spec_from_yaml(songbook_file,
                                                    title = title_of_songbook,
                                                    songFiles = source)
-        return sb2t.create_ready_tex(songbook, papersize)
+        return sb2t.create_ready_tex(songbook, papersize, out)
     else:
-        head = f"single_p.tex"
-        foot = f"single_s.tex"
-
-        with open("src/formats/" + head) as f:
-            content = f.read()
-
-        content = (content
-                   .replace(":title:", title_of_songbook)
-                   .replace(":paper:", "paper"+ papersize)
-                   .replace(":fontsize:", "19pt" if papersize=="a4" else "14pt"))
-
-        content += "".join([s2t.song2tex(file) for file in source])
-
-        with open("src/formats/" + foot) as f:
-            content += f.read()
-
-        return print(content)
+        return sb2t.write_tex(single_tex(source, papersize, title_of_songbook), out)
 
 
 def main():
@@ -0,0 +1,152 @@
+"""Manifest of the PDFs of single songs (<output dir>/<name>.<a4|a5>.pdf), for
+incremental builds of render_pdfs_songs.sh.
+
+The manifest (<output dir>/manifest.json) maps every PDF to the hash of the
+inputs it was rendered from: the song file and the rendering code and template
+(the key of song2tex.fragment_cache()), the single song layout (single_p.tex,
+single_s.tex), the style files, the code building the PDFs (songs2tex.py,
+songbook2tex.py, split_songs_pdf.py, pdf_build.py, tex_format.py and
+render_pdf.sh) and the paper size. A PDF is stale when it's missing or its hash
+differs, so any change of a song, the template or the code is noticed, whatever
+triggered the build.
+
+Usage: python3 src/latex/songs_pdf_manifest.py stale OUTPUT_DIR [XML_SONG_FILES...]
+    Prints the song files (all songs by default) with a stale PDF, after
+    removing the stale PDFs and the PDFs of songs that no longer exist.
+   or: python3 src/latex/songs_pdf_manifest.py record OUTPUT_DIR XML_SONG_FILES...
+    Records the hashes of the rendered PDFs of the song files.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+
+import song2tex as s2t
+import src.lib.list_of_songs as loslib
+import src.lib.songbook as sb
+
+LATEX_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PAPERSIZES = ["a4", "a5"]
+
+# Inputs of the single song PDFs besides the song and song2tex.py (see song2tex.fragment_cache()).
+LAYOUT_INPUTS = [os.path.join(sb.repo_dir(), "src", "formats", "single_p.tex"),
+                 os.path.join(sb.repo_dir(), "src", "formats", "single_s.tex"),
+                 os.path.join(LATEX_DIR, "songbook21wdh.sty"),
+                 os.path.join(LATEX_DIR, "conditionals.sty"),
+                 os.path.join(LATEX_DIR, "songs2tex.py"),
+                 os.path.join(LATEX_DIR, "songbook2tex.py"),
+                 os.path.join(LATEX_DIR, "split_songs_pdf.py"),
+                 os.path.join(LATEX_DIR, "pdf_build.py"),
+                 os.path.join(LATEX_DIR, "tex_format.py"),
+                 os.path.join(sb.repo_dir(), "render_pdf.sh")]
+
+_PDF_RE = re.compile(r"(.+)\.(" + "|".join(PAPERSIZES) + r")\.pdf")
+
+
+def pdf_name(song_file, papersize):
+    return f"{os.path.splitext(os.path.basename(song_file))[0]}.{papersize}.pdf"
+
+
+class SongsPdfManifest:
+    """{PDF file name: hash of its inputs} of the PDFs in output_dir"""
+
+    FILE_NAME = "manifest.json"
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, self.FILE_NAME)
+        self.entries = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f)["entries"]
+        except (OSError, ValueError, KeyError):
+            pass
+        layout = hashlib.sha1()
+        for path in LAYOUT_INPUTS:
+            with open(path, "rb") as f:
+                layout.update(hashlib.sha1(f.read()).digest())
+        self._layout = layout.hexdigest()
+
+    def inputs_hash(self, song_file, papersize):
+        """Hash of the inputs of the song's PDF"""
+        key = s2t.fragment_cache().key(song_file)
+        return hashlib.sha1(f"{key}:{self._layout}:{papersize}".encode("utf-8")).hexdigest()
+
+    def is_fresh(self, song_file, papersize):
+        name = pdf_name(song_file, papersize)
+        return self.entries.get(name) == self.inputs_hash(song_file, papersize) \
+            and os.path.exists(os.path.join(self.output_dir, name))
+
+    def stale(self, song_files):
+        """Song files with a stale PDF; these PDFs are removed, so that only fresh renders get recorded"""
+        stale = []
+        for song_file in song_files:
+            if all(self.is_fresh(song_file, papersize) for papersize in PAPERSIZES):
+                continue
+            stale.append(song_file)
+            for papersize in PAPERSIZES:
+                name = pdf_name(song_file, papersize)
+                self.entries.pop(name, None)
+                self._remove(name)
+        return stale
+
+    def remove_orphans(self, song_files):
+        """Removes the PDFs (and entries) of songs other than song_files, e.g. deleted songs"""
+        names = {os.path.splitext(os.path.basename(song_file))[0] for song_file in song_files}
+        for name in os.listdir(self.output_dir):
+            match = _PDF_RE.fullmatch(name)
+            if match and match.group(1) not in names:
+                logging.info(f"Removing {name} of a song that no longer exists")
+                self._remove(name)
+        self.entries = {name: digest for name, digest in self.entries.items()
+                        if _PDF_RE.fullmatch(name).group(1) in names}
+
+    def record(self, song_files):
+        """Records the hashes of the existing PDFs of the song files"""
+        for song_file in song_files:
+            for papersize in PAPERSIZES:
+                name = pdf_name(song_file, papersize)
+                if os.path.exists(os.path.join(self.output_dir, name)):
+                    self.entries[name] = self.inputs_hash(song_file, papersize)
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.output_dir, name))
+        except FileNotFoundError:
+            pass
+
+    def save(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        # Write to a temporary file first, so an interrupted build never leaves a half-written manifest.
+        fd, tmp = tempfile.mkstemp(dir=self.output_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"entries": self.entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("stale", "record"):
+        print("Usage: python3 songs_pdf_manifest.py <stale|record> OUTPUT_DIR [XML_SONG_FILES...]", file=sys.stderr)
+        exit(1)
+    command, output_dir, files = sys.argv[1], sys.argv[2], sys.argv[3:]
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = SongsPdfManifest(output_dir)
+    if command == "stale":
+        all_files = loslib.files_from_globs(["songs/**/*.xml"], sb.repo_dir())
+        manifest.remove_orphans(all_files)
+        stale = manifest.stale(files or all_files)
+        print(f"{len(stale)} of {len(files or all_files)} songs need rendering", file=sys.stderr)
+        for file in stale:
+            print(file)
+    else:
+        manifest.record(files)
+    manifest.save()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Renders the PDFs of single songs (<output dir>/<name>.<a4|a5>.pdf) from one
+compiled document instead of one LaTeX build per song.
+
+All songs are compiled together in the single layout (songs2tex.split_tex()),
+with the first and last physical page of every song marked in the .aux file
+(\\SongPageMark in song_template.tex). The PDF is then split along these
+marks with qpdf.
+
+Usage: python3 src/latex/split_songs_pdf.py <a4|a5> OUTPUT_DIR XML_SONG_FILES...
+
+Prints the song files that couldn't be split out (e.g. dropped songs, or all
+of them if the document doesn't compile), to be rendered one by one with
+render_pdf.sh; exits with 2 if qpdf is missing.
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import songbook2tex as sb2t
+import songs2tex
+import pdf_build
+import src.lib.songbook as sb
+
+_PAGE_MARK_RE = re.compile(r"\\songpagemark\{(\d+)\}\{(start|end)\}\{(\d+)\}")
+
+
+def read_page_marks(aux_path):
+    """{song index: (first page, last page)} of the \\songpagemark lines of the .aux file"""
+    pages = {}
+    with open(aux_path, encoding="utf-8", errors="replace") as f:
+        for match in _PAGE_MARK_RE.finditer(f.read()):
+            pages.setdefault(int(match.group(1)), {})[match.group(2)] = int(match.group(3))
+    return {song: (marks["start"], marks["end"]) for song, marks in pages.items()
+            if "start" in marks and "end" in marks and marks["start"] <= marks["end"]}
+
+
+def split_songs_pdf(papersize, output_dir, files, tex_dir):
+    """Compiles the song files into one PDF in tex_dir and splits it into output_dir
+
+    Returns:
+        Song files which couldn't be split out
+    """
+    jobname = f"songs_split_{papersize}"
+    # A LaTeX file of its own, like render_pdf.sh, so that parallel runs don't overwrite each other's.
+    fd, tex_file = tempfile.mkstemp(dir=tex_dir, prefix=f".{jobname}.", suffix=".tex")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            sb2t.write_tex(songs2tex.split_tex(files, papersize), f)
+        # pdflatex's output would get mixed with the list of files printed on stdout.
+        pdf_build.build_isolated(tex_file, jobname, tex_dir, make_index=False, stdout=sys.stderr)
+    finally:
+        os.remove(tex_file)
+
+    pdf = os.path.join(tex_dir, jobname + ".pdf")
+    marks = read_page_marks(os.path.join(pdf_build.state_dir(tex_dir, jobname), jobname + ".aux"))
+    failed = []
+    for i, file in enumerate(files):
+        if i not in marks:
+            failed.append(file)
+            continue
+        first, last = marks[i]
+        name = os.path.splitext(os.path.basename(file))[0]
+        out = os.path.join(output_dir, f"{name}.{papersize}.pdf")
+        if subprocess.run(["qpdf", "--empty", "--pages", pdf, f"{first}-{last}", "--", out]).returncode not in (0, 3):
+            # qpdf exits with 3 on warnings, after writing the file
+            failed.append(file)
+    return failed
+
+
+def main():
+    if len(sys.argv) < 4 or sys.argv[1] not in ("a4", "a5"):
+        print("Usage: python3 split_songs_pdf.py <a4|a5> OUTPUT_DIR XML_SONG_FILES...", file=sys.stderr)
+        exit(1)
+    if not shutil.which("qpdf"):
+        print("qpdf not found, songs have to be rendered one by one", file=sys.stderr)
+        exit(2)
+    output_dir = sys.argv[2]
+    os.makedirs(output_dir, exist_ok=True)
+    tex_dir = os.path.join(sb.repo_dir(), "build", "songs_tex")
+    os.makedirs(tex_dir, exist_ok=True)
+    files = sys.argv[3:]
+    try:
+        failed = split_songs_pdf(sys.argv[1], output_dir, files, tex_dir)
+    except subprocess.CalledProcessError as e:
+        print(f"{e.cmd[0]} failed with exit code {e.returncode}, songs have to be rendered one by one", file=sys.stderr)
+        failed = files
+    for file in failed:
+        print(file)
+
+
+if __name__ == "__main__":
+    main()
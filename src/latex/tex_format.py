@@ -0,0 +1,140 @@
+"""Precompiled LaTeX formats (.fmt) of document preambles.
+
+Loading the songbook preamble (document class, fonts, songbook21wdh.sty,
+conditionals.sty and the other packages) takes a good part of every pdflatex
+run. prepare_format() dumps the preamble of a document - everything before
+\\csname endofdump\\endcsname, or else before \\begin{document} - into a format
+with mylatexformat, stored in the build cache directory (see
+list_of_songs.default_cache_dir()) under a name derived from the hash of the
+dumped preamble, the style files and the pdflatex version. Documents
+with the same preamble (e.g. all single songs of one paper size) share it, and
+a changed preamble simply gets a new format.
+
+The rest of the preamble runs in every pdflatex pass. It has to hold whatever
+opens output files, such as \\makeindex: a format can't keep them open, so the
+.idx files would silently stay empty. Preambles which would dump \\makeindex
+get no format.
+
+A format which fails to build is remembered (<name>.failed) for
+FAILED_RETRY_SECONDS, so that builds fall back to plain pdflatex runs without
+retrying it every time, yet a transient failure doesn't disable it for good.
+"""
+
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import src.lib.list_of_songs as loslib
+
+LATEX_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Style files loaded by the preambles (see src/formats/*_p.tex).
+STYLE_FILES = [os.path.join(LATEX_DIR, "songbook21wdh.sty"), os.path.join(LATEX_DIR, "conditionals.sty")]
+
+_BEGIN_DOCUMENT = "\\begin{document}"
+_END_OF_DUMP = "\\csname endofdump\\endcsname"
+
+# Commands opening output streams, which can't be dumped into a format.
+_UNDUMPABLE = ["\\makeindex", "\\immediate\\openout"]
+
+FAILED_RETRY_SECONDS = 24 * 3600
+
+
+def format_dir():
+    """Directory of the precompiled formats, in the build cache directory"""
+    return os.path.join(loslib.default_cache_dir(), "fmt")
+
+
+def preamble(tex_file):
+    """Text of the document to be dumped: before \\csname endofdump\\endcsname or else
+    \\begin{document}; None if there's none"""
+    with open(tex_file, encoding="utf-8") as f:
+        text = f.read()
+    end = text.find(_BEGIN_DOCUMENT)
+    if end < 0:
+        return None
+    dump_end = text.find(_END_OF_DUMP, 0, end)
+    return text[:dump_end if dump_end >= 0 else end]
+
+
+def dumpable(text):
+    """Whether the preamble text can be dumped into a format (see _UNDUMPABLE)"""
+    lines = (line.split("%", 1)[0] for line in text.splitlines())
+    return not any(command in line for line in lines for command in _UNDUMPABLE)
+
+
+_pdflatex_version = None
+
+def pdflatex_version():
+    """First line of `pdflatex --version`, or None if pdflatex can't be run"""
+    global _pdflatex_version
+    if _pdflatex_version is None:
+        try:
+            result = subprocess.run(["pdflatex", "--version"], capture_output=True, text=True, check=True)
+            _pdflatex_version = result.stdout.partition("\n")[0]
+        except (OSError, subprocess.CalledProcessError):
+            _pdflatex_version = ""
+    return _pdflatex_version or None
+
+
+def format_name(text):
+    """Name of the format of the preamble text"""
+    digest = hashlib.sha1(pdflatex_version().encode("utf-8"))
+    digest.update(text.encode("utf-8"))
+    for path in STYLE_FILES:
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha1(f.read()).digest())
+    return "songbook-" + digest.hexdigest()[:20]
+
+
+def prepare_format(tex_file, env, stdout=None):
+    """Name of the format of the document's preamble, built on first use; None if there's no usable format
+
+    Args:
+        tex_file: LaTeX document
+        env: Environment of pdflatex (with TEXINPUTS finding the style files)
+        stdout: Where the output of pdflatex goes (stdout by default)
+    """
+    text = preamble(tex_file)
+    if text is None or not dumpable(text) or pdflatex_version() is None:
+        return None
+    name = format_name(text)
+    directory = format_dir()
+    if os.path.exists(os.path.join(directory, name + ".fmt")):
+        return name
+    try:
+        if time.time() - os.path.getmtime(os.path.join(directory, name + ".failed")) < FAILED_RETRY_SECONDS:
+            return None
+    except OSError:
+        pass  # it never failed
+
+    os.makedirs(directory, exist_ok=True)
+    # Parallel builds may dump the same format; each one works in its own directory.
+    work_dir = tempfile.mkdtemp(dir=directory, prefix=name + ".")
+    try:
+        with open(os.path.join(work_dir, name + ".tex"), "w", encoding="utf-8") as f:
+            f.write(text + _BEGIN_DOCUMENT + "\n\\end{document}\n")
+        result = subprocess.run(["pdflatex", "-ini", "-interaction=nonstopmode", f"-jobname={name}",
+                                 "&pdflatex", "mylatexformat.ltx", name + ".tex"],
+                                cwd=work_dir, env=env, stdout=stdout)
+        fmt = os.path.join(work_dir, name + ".fmt")
+        if result.returncode != 0 or not os.path.exists(fmt):
+            print(f"Building LaTeX format {name} failed, see {name}.failed (retried after "
+                  f"{FAILED_RETRY_SECONDS // 3600}h)", file=sys.stderr)
+            log = os.path.join(work_dir, name + ".log")
+            with open(os.path.join(directory, name + ".failed"), "w", encoding="utf-8") as f:
+                if os.path.exists(log):
+                    with open(log, encoding="utf-8", errors="replace") as l:
+                        f.write(l.read())
+            return None
+        os.replace(fmt, os.path.join(directory, name + ".fmt"))
+        if os.path.exists(os.path.join(directory, name + ".failed")):
+            os.remove(os.path.join(directory, name + ".failed"))
+        print(f"Built LaTeX format {name}", file=sys.stderr)
+        return name
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
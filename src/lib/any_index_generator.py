@@ -1,6 +1,6 @@
 import os
 import sys
-import icu
+import src.lib.collation as collation
 import src.lib.songbook as sb
 from lxml import etree
 
@@ -25,8 +25,7 @@ def create_index(list_of_songs_meta, song2key=(lambda x:x.genre()) ):
 def index2dom(idx, parent):
     keys = list(idx.keys())
 
-    collator = icu.Collator.createInstance(icu.Locale('pl_PL.UTF-8'))
-    keys.sort(key=lambda x: collator.getSortKey(x))
+    keys.sort(key=collation.sort_key)
 
     for k in keys:
         v = idx[k]
@@ -54,10 +53,11 @@ def main():
     songbook_file = os.path.join(sb.repo_dir(), "songbooks/default.songbook.yaml") if len(sys.argv) == 1 else sys.argv[1]
     songbook = sb.load_songbook_spec_from_yaml(songbook_file)
     target_dir = os.path.join(sb.repo_dir(), "build")
+    los = songbook.list_of_songs()
 
-    makeIndex("Gatunki", songbook.list_of_songs(), os.path.join(target_dir, "genres.html"), lambda x:(x.genre() if not x.is_alias() else None))
-    makeIndex("Wykonawcy", songbook.list_of_songs(), os.path.join(target_dir, "artists.html"), lambda x:(x.artist() if not x.is_alias() else None))
-    # create_index_xhtml(songbook.list_of_songs(), target_dir)
+    makeIndex("Gatunki", los, os.path.join(target_dir, "genres.html"), lambda x:(x.genre() if not x.is_alias() else None))
+    makeIndex("Wykonawcy", los, os.path.join(target_dir, "artists.html"), lambda x:(x.artist() if not x.is_alias() else None))
+    # create_index_xhtml(los, target_dir)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
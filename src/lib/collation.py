@@ -0,0 +1,32 @@
+"""
+Locale-aware ordering of titles and index keys.
+
+ICU collators are expensive to create, so one instance per locale is shared
+by the whole process. Songs keep the binary sort keys of their titles (see
+SongMeta.sort_key()), which are persisted with the metadata cache; sort keys
+depend on the ICU version, so the cache records it as well.
+"""
+
+import icu
+
+DEFAULT_LOCALE = 'pl_PL.UTF-8'
+
+# Sort keys computed by another ICU version are not comparable with ours.
+ICU_VERSION = icu.ICU_VERSION
+
+_collators = {}
+
+def collator(locale=DEFAULT_LOCALE):
+    """Shared icu.Collator of the locale (e.g. 'pl_PL.UTF-8' or 'en_US')"""
+    if locale not in _collators:
+        _collators[locale] = icu.Collator.createInstance(icu.Locale(locale))
+    return _collators[locale]
+
+def sort_key(text, locale=DEFAULT_LOCALE):
+    """Binary ICU sort key of the text in the locale"""
+    return collator(locale).getSortKey(text)
+
+def sort_songs(songs, locale=DEFAULT_LOCALE):
+    """Sorts SongMeta/AliasMeta objects in place by title, using their cached sort keys"""
+    songs.sort(key=lambda song: song.sort_key(locale))
+    return songs
@@ -1,9 +1,21 @@
 from lxml import etree
 import os
-import icu #do sortowania po polskich znakach
 import glob
+import hashlib
+import json
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import src.lib.collation as collation
+import src.lib.song_ir as song_ir
 
 class SongMeta:
+    __slots__ = ('_title', '_alias', '_plik', '_genre', '_artist', '_lang', '_text_author', '_sort_keys')
+
+    # Bump whenever the set or meaning of the fields below changes,
+    # so that persisted SongMetaCache entries get invalidated.
+    SCHEMA_VERSION = 2
+
     def __init__(self, title='', alias='', path='', genre='', artist='', lang='', text_author=''):
         self._title = title if title else ''
         self._alias = alias if alias else ''
@@ -12,6 +24,7 @@ class SongMeta:
         self._artist = artist if artist else None
         self._lang = lang if lang else 'pl'
         self._text_author = text_author if text_author else None
+        self._sort_keys = {}  # locale -> {title or alias -> ICU sort key}
 
     def __repr__(self) -> str:
       return "{" + "File:{} Title:{} Alias:{} Artist:{} Genre:{} Lang:{} TextAuthor:{}".format(
@@ -36,9 +49,86 @@ class SongMeta:
             text_author=elementTextOrNone(root.find('{*}text_author')),
         )
 
+    @staticmethod
+    def fromIR(song):
+        return SongMeta(
+            title=song.title,
+            alias=song.alias,
+            path=song.path,
+            genre=song.genre,
+            artist=song.artist,
+            lang=song.lang,
+            text_author=song.text_author,
+        )
+
+    def to_dict(self):
+        return {
+            "title": self._title,
+            "alias": self._alias,
+            "genre": self._genre,
+            "artist": self._artist,
+            "lang": self._lang,
+            "text_author": self._text_author,
+            "sort_keys": {locale: {text: key.hex() for text, key in keys.items()}
+                          for locale, keys in self._sort_keys.items()},
+        }
+
+    @staticmethod
+    def from_dict(d, path):
+        d = dict(d)
+        sort_keys = d.pop("sort_keys", {})
+        song = SongMeta(path=path, **d)
+        song._sort_keys = {locale: {text: bytes.fromhex(key) for text, key in keys.items()}
+                           for locale, keys in sort_keys.items()}
+        return song
+
+    @staticmethod
+    def parseFile(path):
+        """Parses SongMeta of the file without building the (large) <lyric> subtree.
+
+        Metadata elements may come both before and after <lyric> (the schema uses
+        xs:all), so instead of stopping at <lyric> its bytes are cut out before
+        parsing. Whenever that is not obviously safe (comments or CDATA before
+        <lyric>, prefixed or missing <lyric> tag, non-ASCII-compatible encoding,
+        or the cut result doesn't parse) the whole file is parsed instead.
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        start = data.find(b"<lyric")
+        if start >= 0 and data[start + 6:start + 7] in (b">", b"/", b" ", b"\t", b"\r", b"\n") \
+                and b"<!--" not in data[:start] and b"<![CDATA[" not in data[:start]:
+            start_tag_end = data.find(b">", start)
+            if data[start_tag_end - 1:start_tag_end] == b"/":
+                end = start_tag_end + 1
+            else:
+                end = data.find(b"</lyric>", start_tag_end)
+                end = end + len(b"</lyric>") if end >= 0 else -1
+            if start_tag_end > start and end > start:
+                try:
+                    return SongMeta.parseDOM(etree.fromstring(data[:start] + data[end:], base_url=path), path)
+                except etree.XMLSyntaxError:
+                    pass  # e.g. "</lyric>" inside a comment in the lyric; the full parse will tell
+        return SongMeta.parseDOM(etree.fromstring(data, base_url=path), path)
+
     def effectiveTitle(self):
         return self._title
 
+    def text_sort_key(self, text, locale=collation.DEFAULT_LOCALE):
+        """ICU sort key of the song's title or alias, computed once per locale"""
+        keys = self._sort_keys.setdefault(locale, {})
+        if text not in keys:
+            keys[text] = collation.sort_key(text, locale)
+        return keys[text]
+
+    def sort_key(self, locale=collation.DEFAULT_LOCALE):
+        return self.text_sort_key(self._title, locale)
+
+    def compute_sort_keys(self, locale=collation.DEFAULT_LOCALE):
+        """Computes sort keys of the title and all aliases, e.g. before caching the SongMeta"""
+        for text in [self._title] + self.aliases():
+            self.text_sort_key(text, locale)
+        return self
+
     def aliases(self):
         return [self._alias] if (self._alias and self._alias != "") else []
 
@@ -61,6 +151,8 @@ class SongMeta:
         return self._text_author
 
 class AliasMeta:
+    __slots__ = ('_song_meta', '_alias')
+
     def __init__(self, alias, song_meta):
         self._song_meta = song_meta
         self._alias = alias
@@ -77,6 +169,9 @@ class AliasMeta:
     def mainTitle(self):
         return self._song_meta.effectiveTitle()
 
+    def sort_key(self, locale=collation.DEFAULT_LOCALE):
+        return self._song_meta.text_sort_key(self._alias, locale)
+
     def aliases(self):
         return self._song_meta.aliases()
 
@@ -96,20 +191,192 @@ class AliasMeta:
         return True
 
 
-def add_song(path, lista):
-    tree = etree.parse(path)
-    song = SongMeta.parseDOM(tree.getroot(), path)
+class SongMetaCache:
+    """Persistent on-disk cache of parsed SongMeta.
+
+    Entries are keyed by the path of the file relative to the repository, so
+    that copies of the repository (e.g. the backend's per-request checkouts)
+    share them, and validated by the mtime + size of the file in each checkout.
+    When those don't match (e.g. after a fresh checkout) the content hash is
+    compared before falling back to parsing the XML again; either way the
+    checkout's mtime + size are saved, so the next run only needs stat() calls.
+    The whole cache is dropped when the schema or the ICU version (of the
+    stored sort keys) changes.
+    """
+
+    FILE_NAME = "song_meta.json"
+
+    # Bump whenever the keys or the layout of the entries change.
+    FORMAT_VERSION = 3
+
+    def __init__(self, cache_dir):
+        self.path = os.path.join(cache_dir, self.FILE_NAME)
+        self.entries = self._load()
+        self._changed = {}
+        self._pending = {}
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("format") == self.FORMAT_VERSION and data.get("version") == SongMeta.SCHEMA_VERSION \
+                    and data.get("icu_version") == collation.ICU_VERSION:
+                return data["entries"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    @staticmethod
+    def key(path):
+        """Cache key of the song file: its path relative to the repository, with forward slashes"""
+        return os.path.relpath(os.path.realpath(path), _REPO_DIR).replace(os.sep, "/")
+
+    def lookup(self, path):
+        """Returns cached SongMeta for the path, or None if the file changed since it was cached."""
+        st = os.stat(path)
+        key = self.key(path)
+        entry = self.entries.get(key)
+        if entry and entry["stats"].get(_REPO_DIR) == [st.st_mtime_ns, st.st_size]:
+            return SongMeta.from_dict(entry["meta"], path)
+
+        digest = file_digest(path)
+        if entry and entry["sha1"] == digest:
+            entry["stats"][_REPO_DIR] = [st.st_mtime_ns, st.st_size]
+            self._changed[key] = entry
+            return SongMeta.from_dict(entry["meta"], path)
+        self._pending[path] = (st, digest)
+        return None
+
+    def store(self, song):
+        """Stores freshly parsed SongMeta of a file previously missed by lookup()."""
+        st, digest = self._pending.pop(song.plik())
+        # Stats of other checkouts are of the previous content, so they are dropped.
+        entry = {"sha1": digest, "stats": {_REPO_DIR: [st.st_mtime_ns, st.st_size]}, "meta": song.to_dict()}
+        self.entries[self.key(song.plik())] = entry
+        self._changed[self.key(song.plik())] = entry
+
+    def save(self):
+        """Writes the entries stored or revalidated since loading, merged into the current cache file"""
+        if not self._changed:
+            return
+        # Parallel jobs (possibly of other checkouts) may have saved their entries since this cache was loaded; keep them.
+        entries = self._load()
+        for key, entry in self._changed.items():
+            saved = entries.get(key)
+            if saved and saved["sha1"] == entry["sha1"]:
+                entry["stats"] = {**saved["stats"], **entry["stats"]}
+            entries[key] = entry
+        self.entries = {key: entry for key, entry in entries.items() if os.path.exists(os.path.join(_REPO_DIR, key))}
+        for entry in self.entries.values():
+            entry["stats"] = {root: stat for root, stat in entry["stats"].items() if os.path.isdir(root)}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Write to a temporary file first, so parallel jobs never see a half-written cache.
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"format": self.FORMAT_VERSION, "version": SongMeta.SCHEMA_VERSION,
+                           "icu_version": collation.ICU_VERSION, "entries": self.entries}, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+            self._changed = {}
+        except OSError as e:
+            logging.warning(f"Cannot save song metadata cache {self.path}: {e}")
+
+
+def file_digest(path):
+    """SHA-1 of the file's content, hex-encoded"""
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+_REPO_DIR = os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", ".."))
+
+def default_cache_dir():
+    """Directory for persistent build caches: $SONGBOOK_CACHE_DIR or build/cache in the repo."""
+    if "SONGBOOK_CACHE_DIR" in os.environ:
+        return os.environ["SONGBOOK_CACHE_DIR"]
+    return os.path.join(_REPO_DIR, "build", "cache")
+
+
+def default_jobs():
+    """Number of worker processes from $SONGBOOK_JOBS (1 by default, 0 means all cores)."""
+    jobs = int(os.environ.get("SONGBOOK_JOBS", "1"))
+    return jobs if jobs > 0 else os.cpu_count()
+
+
+def add_song_meta(song, lista):
     for a in song.aliases():
         lista.append(AliasMeta(a, song))
     lista.append(song)
 
-def list_of_song_from_files(files):
+def add_song(path, lista):
+    add_song_meta(SongMeta.fromIR(song_ir.load_song(path)), lista)
+
+def parse_song_metas(files):
+    """Parses SongMeta of each file (without aliases), keeping the order of files.
+
+    Sort keys for the default locale are computed here too, so that they are
+    spread over worker processes and stored in the SongMetaCache.
+    """
+    return [SongMeta.parseFile(file).compute_sort_keys() for file in files]
+
+# Below this many files a process pool costs more than it saves.
+MIN_FILES_PER_JOB = 32
+
+def parse_song_metas_parallel(files, jobs):
+    """Like parse_song_metas, but spreads chunks of files over a pool of jobs processes."""
+    jobs = min(jobs, len(files) // MIN_FILES_PER_JOB)
+    if jobs <= 1:
+        return parse_song_metas(files)
+    # A few chunks per worker evens out differences in song sizes.
+    chunk_size = -(-len(files) // (jobs * 4))
+    chunks = [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # map() yields results in the order of chunks, so the result is deterministic.
+        return [song for chunk in pool.map(parse_song_metas, chunks) for song in chunk]
+
+def load_song_metas(files, cache=True, jobs=None):
+    """
+    Load SongMeta (without aliases) of the given song files, in the order of files.
+
+    Args:
+        files: List of paths to song XML files
+        cache: Whether to use the persistent SongMetaCache (see default_cache_dir())
+        jobs: Number of processes parsing the files (defaults to default_jobs())
+    """
+    if jobs is None:
+        jobs = default_jobs()
+    files = list(files)
+    songs = [None] * len(files)
+    meta_cache = SongMetaCache(default_cache_dir()) if cache else None
+    if meta_cache:
+        for i, file in enumerate(files):
+            songs[i] = meta_cache.lookup(file)
+    missing = [i for i, song in enumerate(songs) if song is None]
+    for i, song in zip(missing, parse_song_metas_parallel([files[i] for i in missing], jobs)):
+        songs[i] = song
+        if meta_cache:
+            meta_cache.store(song)
+    if meta_cache:
+        meta_cache.save()
+    return songs
+
+def list_of_song_from_metas(songs, locale=collation.DEFAULT_LOCALE):
+    """Adds aliases of the SongMeta objects and sorts all of them by title in the locale."""
     list_od_meta = []
-    for file in files:
-        add_song(file, list_od_meta)
-    collator = icu.Collator.createInstance(icu.Locale('pl_PL.UTF-8'))
-    list_od_meta.sort(key=lambda x: collator.getSortKey(x.effectiveTitle()))
-    return list_od_meta
+    for song in songs:
+        add_song_meta(song, list_od_meta)
+    return collation.sort_songs(list_od_meta, locale)
+
+def list_of_song_from_files(files, cache=True, jobs=None):
+    """
+    Load metadata of the given song files, sorted by title.
+
+    Args:
+        files: List of paths to song XML files
+        cache: Whether to use the persistent SongMetaCache (see default_cache_dir())
+        jobs: Number of processes parsing the files (defaults to default_jobs())
+    """
+    return list_of_song_from_metas(load_song_metas(files, cache=cache, jobs=jobs))
 
 def list_of_song_from_globs(glob_patterns, base_dir=None):
     """
@@ -130,6 +397,20 @@ def list_of_song_from_globs(glob_patterns, base_dir=None):
         except:
             base_dir = os.getcwd()
     
+    # Use existing function to load songs from files
+    return list_of_song_from_files(files_from_globs(glob_patterns, base_dir))
+
+def files_from_globs(glob_patterns, base_dir):
+    """
+    Song files matching any of the glob patterns, deduplicated and sorted.
+
+    Args:
+        glob_patterns: List of glob pattern strings
+        base_dir: Base directory for resolving patterns
+
+    Returns:
+        Sorted list of real paths of the matching .xml files
+    """
     # Collect all files from glob patterns
     all_files = set()  # Use set for automatic deduplication
     
@@ -148,7 +429,4 @@ def list_of_song_from_globs(glob_patterns, base_dir=None):
                 all_files.add(normalized_path)
     
     # Convert set back to sorted list for consistent ordering
-    file_list = sorted(list(all_files))
-    
-    # Use existing function to load songs from files
-    return list_of_song_from_files(file_list)
+    return sorted(list(all_files))
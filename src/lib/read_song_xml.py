@@ -1,11 +1,18 @@
 # File parsing song in xml
 
-from lxml import etree
 from enum import Enum
+import sys
+
+import src.lib.song_ir as song_ir
+
+# The models below use __slots__: whole parsed corpora are kept in memory,
+# with one RowChunk per chord. Chords repeat a lot, so they are interned.
 
 class RowChunk:  # obsługuje akordy
+    __slots__ = ('chord', 'content')
+
     def __init__(self, chord='', content=None):
-        self.chord = chord
+        self.chord = sys.intern(chord)
         if content is None:
             self.content = ''
         else:
@@ -24,6 +31,8 @@ class RowType(Enum):
 
 
 class Row:
+    __slots__ = ('row_type', 'new_chords', 'chunks', 'bis', 'instr', 'sidechords')
+
     def __init__(self, row_type=RowType.MIDDLE, new_chords=False, bis=False, chunks=None, instr=False, sidechords=None):
         self.row_type = row_type
         self.new_chords = new_chords
@@ -33,19 +42,32 @@ class Row:
         self.sidechords = sidechords
 
     @staticmethod
-    def parseDOM(root, bis=False):
-        if root.text:
-            chunks = [RowChunk(content=root.text)]
+    def fromIR(row):
+        if row.text:
+            chunks = [RowChunk(content=row.text)]
         else:
             chunks = []
-        for chunk in root.getchildren():
-            chunks.append(RowChunk(chord=chunk.attrib['a'], content=chunk.tail))
+        for chord, text in row.chunks:
+            chunks.append(RowChunk(chord=chord, content=text))
         return Row(
-            new_chords=root.attrib.get('important_over', 'false')=='true',
-            bis=bis,
+            new_chords=row.important_over,
+            bis=row.bis,
             chunks=chunks,
-            instr=(root.attrib.get('style', '')=='instr'),
-            sidechords=root.attrib.get('sidechords', None))
+            instr=row.instr,
+            sidechords=row.sidechords)
+
+
+class LinkedRow:
+    """Row of a linked block: the row of the referenced block, without new chords"""
+    __slots__ = ('row',)
+
+    new_chords = False
+
+    def __init__(self, row):
+        self.row = row
+
+    def __getattr__(self, name):
+        return getattr(self.row, name)
 
 
 class BlockType(Enum):
@@ -65,36 +87,39 @@ class BlockType(Enum):
 
 
 class Block:
+    __slots__ = ('block_type', 'rows')
+
     def __init__(self, block_type=BlockType.VERSE, rows=None):
         self.block_type = block_type
         self.rows = [] if rows is None else rows
 
     @staticmethod
-    def parseDOM(root, linked=False):
-        block_type = BlockType.parse(root.attrib['type'])
-        rows = []
-        for child in root.getchildren():
-            if child.tag == '{http://21wdh.staszic.waw.pl}bis':
-                bis_rows = [Row.parseDOM(row, bis=True) for row in child.findall('{*}row')]
-                bis_times = int(child.attrib.get('times', '2'))
-                bis_rows[-1].bis = bis_times
-                rows += bis_rows
-            else:
-                rows.append(Row.parseDOM(child))
+    def rowsFromIR(rows_ir):
+        rows = [Row.fromIR(row) for row in rows_ir]
         if len(rows) == 1:
             rows[0].row_type = RowType.SINGLE
         elif len(rows) > 1:
             rows[0].row_type = RowType.FIRST_SPECIAL
             rows[-1].row_type = RowType.LAST
-        if linked:
-            for row in rows:
-                row.new_chords = False
+        return rows
+
+    @staticmethod
+    def fromIR(block, rows=None):
+        """Block of the BlockIR. Linked blocks only wrap the rows (from rowsFromIR), which can be shared."""
+        block_type = BlockType.parse(block.block_type)
+        if rows is None:
+            rows = Block.rowsFromIR(block.rows)
+        if block.linked:
+            rows = [LinkedRow(row) for row in rows]
         return Block(block_type=block_type, rows=rows)
 
 
 class Song:
+    __slots__ = ('title', 'text_author', 'composer', 'artist', 'original_title', 'translator', 'alias',
+                 'comment', 'blocks', 'music_source', 'album', 'metre', 'barre', 'lang', 'xml_lang')
+
     def __init__(self, title='', text_author='', composer='', artist='', original_title='', translator='', alias='',
-                 comment='', music_source='', album='', blocks=None, metre='', barre=''):
+                 comment='', music_source='', album='', blocks=None, metre='', barre='', lang=None, xml_lang=None):
         self.title = title if title else ''
         self.text_author = text_author if text_author else ''
         self.composer = composer if composer else ''
@@ -108,6 +133,8 @@ class Song:
         self.album = album if album else ''
         self.metre = metre if metre else ''
         self.barre = barre if barre else ''
+        self.lang = lang
+        self.xml_lang = xml_lang
 
     def extract_plain_lyrics(self):
         """Extract plain text lyrics without chords for SEO"""
@@ -124,42 +151,44 @@ class Song:
         return '\n'.join(lyrics_lines)
 
     @staticmethod
-    def parseDOM(root):
-        # A child of 'lyric' element may either be a text block, a reference to a text block (e.g. to a chorus), or a tablature.
-        text_blocks = root.findall('{*}lyric/{*}block')
-
-        def elementTextOrNone(elem):
-            return elem.text if elem is not None else None
+    def blocksFromIR(blocks):
+        """Blocks of the song; every distinct block (and linked view of it) is built once and shared"""
+        rows = {}
+        views = {}
 
-        def get_attrib(elem, a):
-            return elem.attrib.get(a) if elem is not None else None
+        def block_view(block):
+            if (id(block.rows), block.linked) not in views:
+                if id(block.rows) not in rows:
+                    rows[id(block.rows)] = Block.rowsFromIR(block.rows)
+                views[id(block.rows), block.linked] = Block.fromIR(block, rows[id(block.rows)])
+            return views[id(block.rows), block.linked]
 
-        def flatten(block):
-            return Block.parseDOM(block) if 'blocknb' not in block.attrib else Block.parseDOM(
-                text_blocks[int(block.attrib['blocknb']) - 1], linked=True)
+        return [block_view(block) for block in blocks]
 
-        blocks = [flatten(block) for block in root.find('{*}lyric').getchildren() if
-                  block.tag != '{http://21wdh.staszic.waw.pl}tabbs']
-
-        x = root.xpath("./s:music/s:guitar/@barre", namespaces={"s": "http://21wdh.staszic.waw.pl"})
+    @staticmethod
+    def fromIR(song):
         return Song(
-            title=root.get('title'),
-            text_author=elementTextOrNone(root.find('{*}text_author')),
-            composer=elementTextOrNone(root.find('{*}composer')),
-            artist=elementTextOrNone(root.find('{*}artist')),
-            original_title=elementTextOrNone(root.find('{*}original_title')),
-            translator=elementTextOrNone(root.find('{*}translator')),
-            comment=elementTextOrNone(root.find('{*}comment')),
-            alias=elementTextOrNone(root.find('{*}alias')),
-            blocks=blocks,
-            metre=get_attrib(root.find('{*}music'), 'metre'),
-            barre=x[0] if x else None,
-            album=elementTextOrNone(root.find('{*}album')),
-            music_source=elementTextOrNone(root.find('{*}music_source'))
+            title=song.title,
+            text_author=song.text_author,
+            composer=song.composer,
+            artist=song.artist,
+            original_title=song.original_title,
+            translator=song.translator,
+            comment=song.comment,
+            alias=song.alias,
+            blocks=Song.blocksFromIR(song.blocks),
+            metre=song.metre,
+            barre=song.barre,
+            album=song.album,
+            music_source=song.music_source,
+            lang=song.lang,
+            xml_lang=song.xml_lang
         )
 
+    @staticmethod
+    def parseDOM(root):
+        return Song.fromIR(song_ir.SongIR.parseDOM(root))
+
 
 def parse_song_xml(path):
-    tree = etree.parse(path)
-    song = Song.parseDOM(tree.getroot())
-    return song
+    return Song.fromIR(song_ir.load_song(path))
@@ -0,0 +1,194 @@
+"""
+Compiled corpus: a binary bundle of the SongIR of every song.
+
+The bundle (corpus.bin in the cache directory, see default_bundle_path()) is
+memory-mapped and songs are decoded lazily, one at a time, so generators don't
+need lxml for songs that didn't change since the bundle was compiled.
+
+Layout:
+    MAGIC, header length (uint32 LE), marshal-ed header, records
+
+The header holds the format version, the Python version (marshal's format
+depends on it) and, for every song path (relative to base_dir), the offset
+and length of its record plus mtime, size and SHA-1 of the source file.
+A record is the marshal-ed tuple encoding of one SongIR.
+
+compile_bundle() refreshes the bundle incrementally: records of files whose
+content hash didn't change are copied over without parsing.
+"""
+
+import logging
+import marshal
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+import src.lib.list_of_songs as loslib
+import src.lib.song_ir as song_ir
+
+MAGIC = b"SONGBND\0"
+FORMAT_VERSION = 2
+_HEADER_LENGTH = struct.Struct("<I")
+
+
+def encode_song(song):
+    """Tuple encoding of the SongIR; blocks linked to the same rows share them"""
+    row_sets = []
+    row_set_index = {}
+    blocks = []
+    for block in song.blocks:
+        if id(block.rows) not in row_set_index:
+            row_set_index[id(block.rows)] = len(row_sets)
+            row_sets.append(tuple((row.text, row.chunks, row.bis, row.instr, row.important_over, row.sidechords)
+                                  for row in block.rows))
+        blocks.append((block.block_type, row_set_index[id(block.rows)], block.linked))
+    return (song.title, song.lang, song.xml_lang, song.alias, song.genre, song.artist, song.text_author,
+            song.composer, song.original_title, song.translator, song.comment, song.album, song.music_source,
+            song.metre, song.barre, tuple(row_sets), tuple(blocks))
+
+
+def decode_song(data, path):
+    """SongIR of the tuple encoding made by encode_song()"""
+    (title, lang, xml_lang, alias, genre, artist, text_author, composer, original_title, translator, comment,
+     album, music_source, metre, barre, row_sets, blocks) = data
+    rows = [tuple(song_ir.RowIR(*row) for row in row_set) for row_set in row_sets]
+    return song_ir.SongIR(
+        path=path, title=title, lang=lang, xml_lang=xml_lang, alias=alias, genre=genre, artist=artist,
+        text_author=text_author, composer=composer, original_title=original_title, translator=translator,
+        comment=comment, album=album, music_source=music_source, metre=metre, barre=barre,
+        blocks=tuple(song_ir.BlockIR(block_type, rows[i], linked) for block_type, i, linked in blocks))
+
+
+class SongBundle:
+    """Read-only, memory-mapped compiled corpus"""
+
+    def __init__(self, path, base_dir):
+        """
+        Args:
+            path: Path of the bundle file (it doesn't need to exist)
+            base_dir: Directory the song paths in the bundle are relative to
+        """
+        self.path = path
+        self.base_dir = os.path.realpath(base_dir)
+        self.entries = {}  # relative path -> (offset, length, mtime_ns, size, sha1)
+        self._data = None
+        self._data_start = 0
+        try:
+            with open(path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return  # missing or empty bundle
+        try:
+            if data[:len(MAGIC)] != MAGIC:
+                raise ValueError("not a song bundle")
+            start = len(MAGIC) + _HEADER_LENGTH.size
+            (header_length,) = _HEADER_LENGTH.unpack_from(data, len(MAGIC))
+            header = marshal.loads(data[start:start + header_length])
+            if header["version"] != FORMAT_VERSION or header["python"] != tuple(sys.version_info[:2]):
+                logging.info(f"Ignoring song bundle {path} of another format or Python version")
+                data.close()
+                return
+            self.entries = header["entries"]
+            self._data = data
+            self._data_start = start + header_length
+        except (ValueError, EOFError, TypeError, KeyError, struct.error) as e:
+            logging.warning(f"Ignoring broken song bundle {path}: {e}")
+            data.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, path):
+        """Bundle key (path relative to base_dir) of the song file"""
+        return os.path.relpath(os.path.realpath(path), self.base_dir)
+
+    def record(self, key):
+        """Raw (marshal-ed) record of the song"""
+        offset, length = self.entries[key][:2]
+        start = self._data_start + offset
+        return self._data[start:start + length]
+
+    def load(self, path):
+        """SongIR of the file if the bundle holds its current version, None otherwise
+
+        The file's mtime and size are compared first; when they differ (e.g.
+        after a fresh checkout) the SHA-1 of its content decides.
+        """
+        key = self.key(path)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        st = os.stat(path)
+        if (entry[2], entry[3]) != (st.st_mtime_ns, st.st_size) and entry[4] != loslib.file_digest(path):
+            return None
+        return decode_song(marshal.loads(self.record(key)), path)
+
+
+def compile_bundle(files, base_dir, path):
+    """Writes the bundle of the song files, reusing records of the existing bundle at path
+
+    Returns:
+        (number of songs reused, number of songs parsed)
+    """
+    old = SongBundle(path, base_dir)
+    entries = {}
+    records = []
+    offset = 0
+    reused = parsed = 0
+    for file in files:
+        key = old.key(file)
+        st = os.stat(file)
+        entry = old.entries.get(key)
+        if entry and (entry[2], entry[3]) == (st.st_mtime_ns, st.st_size):
+            digest, record = entry[4], old.record(key)
+        else:
+            digest = loslib.file_digest(file)
+            if entry and entry[4] == digest:
+                record = old.record(key)
+            else:
+                record = None
+        if record is not None:
+            reused += 1
+        else:
+            try:
+                record = marshal.dumps(encode_song(song_ir.parse_song(file)))
+            except Exception as e:
+                # Generators will parse (and report) the file themselves.
+                logging.warning(f"Skipping {file} in song bundle: {e}")
+                continue
+            parsed += 1
+        entries[key] = (offset, len(record), st.st_mtime_ns, st.st_size, digest)
+        records.append(record)
+        offset += len(record)
+
+    header = marshal.dumps({"version": FORMAT_VERSION, "python": tuple(sys.version_info[:2]), "entries": entries})
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Write to a temporary file first, so readers never see a half-written bundle.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER_LENGTH.pack(len(header)))
+        f.write(header)
+        for record in records:
+            f.write(record)
+    os.replace(tmp, path)
+    logging.info(f"Compiled song bundle {path}: {reused} songs reused, {parsed} parsed, {len(old.entries.keys() - entries.keys())} removed")
+    return reused, parsed
+
+
+def default_bundle_path():
+    """corpus.bin in the build cache directory (see list_of_songs.default_cache_dir())"""
+    return os.path.join(loslib.default_cache_dir(), "corpus.bin")
+
+
+_bundle = None
+
+def shared_bundle():
+    """The process-wide SongBundle at default_bundle_path(), opened on first use"""
+    global _bundle
+    if _bundle is None:
+        from . import songbook
+        _bundle = SongBundle(default_bundle_path(), songbook.repo_dir())
+    return _bundle
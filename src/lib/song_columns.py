@@ -0,0 +1,102 @@
+"""
+Columnar representation of song metadata for fast evaluation of song matchers.
+
+Each field of the songs (title, genre, artist, ...) is stored dictionary
+encoded: every distinct value maps to a bitmap of the songs having it. A bitmap
+is a Python int, where bit i stands for songs[i]. Matchers combine bitmaps
+with | and &, and conditions are evaluated once per distinct value instead of
+once per song.
+"""
+
+from src.lib.song_matchers import FieldSongMatcher
+
+
+def bitmap_of(indexes):
+    """Bitmap with the bits of the given (non-negative) indexes set"""
+    indexes = list(indexes)
+    # Setting bits in a bytearray avoids re-building a large int for every index.
+    bits = bytearray((max(indexes, default=-1) >> 3) + 1)
+    for i in indexes:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class Column:
+    """Distinct values of one field, each with the bitmap of songs having it"""
+
+    def __init__(self, values):
+        """
+        Args:
+            values: Field values of consecutive songs (strings or None)
+        """
+        positions = {}
+        for i, value in enumerate(values):
+            positions.setdefault(value, []).append(i)
+        self.bitmaps = {value: bitmap_of(indexes) for value, indexes in positions.items()}
+        self._stripped = None
+
+    def stripped(self):
+        """Bitmaps keyed by str(value).strip(), skipping None values"""
+        if self._stripped is None:
+            self._stripped = {}
+            for value, bitmap in self.bitmaps.items():
+                if value is not None:
+                    key = str(value).strip()
+                    self._stripped[key] = self._stripped.get(key, 0) | bitmap
+        return self._stripped
+
+    def select(self, predicate):
+        """Bitmap of songs whose value satisfies the predicate (called once per distinct value)"""
+        result = 0
+        for value, bitmap in self.bitmaps.items():
+            if predicate(value):
+                result |= bitmap
+        return result
+
+
+class SongColumns:
+    """Columnar, interned view of a list of SongMeta and AliasMeta objects"""
+
+    # Field extractors, beyond the ones supported by FieldSongMatcher
+    EXTRA_EXTRACTORS = {
+        'path': lambda song: song.plik() if hasattr(song, 'plik') else None,
+    }
+
+    def __init__(self, songs):
+        """
+        Args:
+            songs: List of SongMeta/AliasMeta objects; bit i of bitmaps refers to songs[i]
+        """
+        self.songs = list(songs)
+        self.all = (1 << len(self.songs)) - 1
+        self._columns = {}
+
+    def column(self, field):
+        """Column of the field, built on first use"""
+        if field not in self._columns:
+            extractor = FieldSongMatcher.FIELD_EXTRACTORS.get(field) or self.EXTRA_EXTRACTORS[field]
+
+            def value(song):
+                try:
+                    return extractor(song)
+                except Exception:
+                    # Same as FieldSongMatcher.matches(): such songs never match.
+                    return None
+
+            self._columns[field] = Column(value(song) for song in self.songs)
+        return self._columns[field]
+
+    def bitmap(self, predicate):
+        """Bitmap of songs for which predicate(song) is true (one call per song)"""
+        return bitmap_of(i for i, song in enumerate(self.songs) if predicate(song))
+
+    def select(self, bitmap):
+        """Songs whose bits are set in the bitmap, in the order of songs"""
+        # bin() is reversed, so that position in the string == song index
+        bits = bin(bitmap)[:1:-1]
+        result = []
+        i = bits.find('1')
+        while i >= 0:
+            result.append(self.songs[i])
+            i = bits.find('1', i + 1)
+        return result
@@ -0,0 +1,179 @@
+"""
+Process-wide corpus of song metadata shared by all generators.
+
+Loading the corpus (globbing, parsing and sorting all songs) is done once per
+process and base directory. Songbooks get filtered views of it, which keep
+the corpus (title) order, so they never need to be sorted again - unless the
+songbook uses another locale, in which case the sort keys cached on the songs
+are used.
+
+Songbooks selecting songs only by glob patterns don't need the whole corpus:
+only the files their patterns point to are parsed.
+"""
+
+import logging
+import os
+import weakref
+
+import src.lib.collation as collation
+import src.lib.list_of_songs as loslib
+from src.lib.song_columns import SongColumns
+from src.lib.song_matchers import GlobSongMatcher, GlobSetSongMatcher, OrSongMatcher
+
+
+class SongCorpus:
+    """All songs (and their aliases) found under base_dir, sorted by title"""
+
+    def __init__(self, base_dir, glob_patterns=("songs/**/*.xml",)):
+        """
+        Args:
+            base_dir: Base directory for resolving glob patterns (usually repo root)
+            glob_patterns: Glob patterns selecting the song files of the corpus
+        """
+        self.base_dir = base_dir
+        self.glob_patterns = list(glob_patterns)
+        self._membership = GlobSetSongMatcher([GlobSongMatcher(p, base_dir) for p in self.glob_patterns], base_dir)
+        self._metas = {}  # file path -> SongMeta
+        self._songs = None
+        self._columns = None
+        self._views = weakref.WeakKeyDictionary()
+
+    def _load(self, files):
+        """SongMeta objects of the files, parsing only those not loaded yet"""
+        missing = [f for f in files if f not in self._metas]
+        if missing:
+            self._metas.update(zip(missing, loslib.load_song_metas(missing)))
+        return [self._metas[f] for f in files]
+
+    def songs(self):
+        """All SongMeta and AliasMeta objects of the corpus, sorted by title"""
+        if self._songs is None:
+            files = loslib.files_from_globs(self.glob_patterns, self.base_dir)
+            self._songs = loslib.list_of_song_from_metas(self._load(files))
+            logging.info(f"Loaded corpus of {len(self._songs)} songs and aliases from {self.base_dir}")
+        return self._songs
+
+    def songs_from_globs(self, glob_patterns):
+        """Songs of the corpus matching any of the glob patterns, sorted by title
+
+        Only directories under the literal prefixes of the patterns are walked
+        and only the matching files are parsed (unless the corpus is loaded anyway).
+        """
+        if self._songs is not None:
+            return self.filter(OrSongMatcher([GlobSongMatcher(p, self.base_dir) for p in glob_patterns]))
+        files = [f for f in loslib.files_from_globs(glob_patterns, self.base_dir) if self._is_member(f)]
+        logging.info(f"Loading {len(files)} song files matching {len(glob_patterns)} glob patterns")
+        return loslib.list_of_song_from_metas(self._load(files))
+
+    def _is_member(self, path):
+        """Whether the file would be part of the corpus loaded by songs()"""
+        rel_path = os.path.relpath(path, os.path.realpath(self.base_dir))
+        # glob.glob() skips hidden files and directories unless named explicitly.
+        if any(part.startswith('.') for part in rel_path.split(os.sep)):
+            return False
+        return self._membership.matches_path(path)
+
+    def columns(self):
+        """SongColumns of all songs of the corpus, built on first use"""
+        if self._columns is None:
+            self._columns = SongColumns(self.songs())
+        return self._columns
+
+    def filter(self, matcher):
+        """Songs matching the given SongMatcher, in corpus order"""
+        columns = self.columns()
+        return columns.select(matcher.bitmap(columns))
+
+    def songs_for(self, songbook):
+        """Songs of the given SongbookSpec, in corpus order.
+
+        The result is memoized per SongbookSpec object, so repeated calls
+        (e.g. for the main list and for indexes) are free.
+        """
+        if songbook not in self._views:
+            matcher = songbook.matcher()
+            glob_patterns = matcher.glob_patterns()
+            if glob_patterns and self._songs is None:
+                songs = [song for song in self.songs_from_globs(glob_patterns) if matcher.matches(song)]
+            else:
+                logging.info(f"Filtering {len(self.songs())} songs for songbook '{songbook.title()}' with {len(matcher.matchers)} matchers")
+                songs = self.filter(matcher)
+            if songbook.locale() != collation.DEFAULT_LOCALE:
+                songs = collation.sort_songs(list(songs), songbook.locale())
+            self._views[songbook] = songs
+            logging.info(f"Found {len(songs)} matching songs for '{songbook.title()}'")
+        return self._views[songbook]
+
+    def add_view(self, songbook, songs):
+        """Sets the songs of the SongbookSpec returned by songs_for(), unless they are already known
+
+        Args:
+            songbook: SongbookSpec
+            songs: Songs of the songbook selected from this corpus, in the order songs_for() returns them
+        """
+        if songbook not in self._views:
+            self._views[songbook] = songs
+
+    def resolve(self, songbooks):
+        """SongbookMembership of the corpus songs in the given SongbookSpecs"""
+        return SongbookMembership(self, songbooks)
+
+
+class SongbookMembership:
+    """Song -> songbooks membership matrix of a corpus and a set of songbooks
+
+    The matchers of all songbooks are evaluated together, against the same
+    SongColumns of the corpus, on first use. Each songbook's row of the matrix
+    is a bitmap over the corpus songs.
+    """
+
+    def __init__(self, corpus, songbooks):
+        """
+        Args:
+            corpus: SongCorpus the songs are selected from
+            songbooks: SongbookSpec objects to resolve
+        """
+        self.corpus = corpus
+        self.songbooks = list(songbooks)
+        self._bitmaps = None
+        self._matrix = None
+
+    def bitmaps(self):
+        """Bitmap of songs of every songbook, keyed by SongbookSpec"""
+        if self._bitmaps is None:
+            columns = self.corpus.columns()
+            logging.info(f"Resolving {len(self.songbooks)} songbooks against {len(columns.songs)} songs")
+            self._bitmaps = {songbook: songbook.matcher().bitmap(columns) for songbook in self.songbooks}
+            for songbook, bitmap in self._bitmaps.items():
+                # Shares the results with SongCorpus.songs_for()
+                if songbook.locale() == collation.DEFAULT_LOCALE:
+                    self.corpus.add_view(songbook, columns.select(bitmap))
+        return self._bitmaps
+
+    def songs_of(self, songbook):
+        """Songs of the songbook, in corpus order"""
+        self.bitmaps()
+        return songbook.list_of_songs(self.corpus)
+
+    def songbooks_of(self, song):
+        """SongbookSpecs containing the song (a SongMeta or AliasMeta of the corpus)"""
+        return self.matrix().get(song, [])
+
+    def matrix(self):
+        """Dict of every corpus song to the list of SongbookSpecs containing it"""
+        if self._matrix is None:
+            columns = self.corpus.columns()
+            self._matrix = {song: [] for song in columns.songs}
+            for songbook, bitmap in self.bitmaps().items():
+                for song in columns.select(bitmap):
+                    self._matrix[song].append(songbook)
+        return self._matrix
+
+
+_corpora = {}
+
+def shared_corpus(base_dir):
+    """Returns the process-wide SongCorpus for the base directory, creating it on first use"""
+    if base_dir not in _corpora:
+        _corpora[base_dir] = SongCorpus(base_dir)
+    return _corpora[base_dir]
@@ -0,0 +1,157 @@
+"""
+Canonical, parse-once representation of a song XML file.
+
+A SongIR carries the song's metadata and the structure of its lyrics (blocks,
+rows and chord/text chunks) as raw strings, exactly as found in the XML.
+The backends (SongMeta, the HTML/EPUB model of read_song_xml and the LaTeX
+model of song2tex) build their own views from it, applying their own rules
+(escaping, row types, linked block handling), without touching lxml again.
+
+The IR is immutable by convention: backends copy what they modify. load_song()
+keeps one SongIR per file and process, re-parsing only files that changed,
+and takes it from the compiled corpus (see song_bundle) whenever possible.
+"""
+
+import os
+
+from lxml import etree
+
+NS = "http://21wdh.staszic.waw.pl"
+
+
+class RowIR:
+    """One row of lyrics: leading text and (chord, text) chunks"""
+    __slots__ = ('text', 'chunks', 'bis', 'instr', 'important_over', 'sidechords')
+
+    def __init__(self, text, chunks, bis, instr, important_over, sidechords):
+        self.text = text  # text before the first chord (None if absent)
+        self.chunks = chunks  # tuple of (chord, text following the chord or None)
+        self.bis = bis  # False, True, or the repetition count on the last row of a <bis>
+        self.instr = instr
+        self.important_over = important_over
+        self.sidechords = sidechords
+
+    @staticmethod
+    def parseDOM(root, bis=False):
+        return RowIR(
+            text=root.text,
+            chunks=tuple((chunk.attrib['a'], chunk.tail) for chunk in root.getchildren()),
+            bis=bis,
+            instr=root.attrib.get('style', 'normal') == 'instr',
+            important_over=root.attrib.get('important_over', 'false') == 'true',
+            sidechords=root.attrib.get('sidechords', None))
+
+
+class BlockIR:
+    """Block of rows; linked blocks (references by blocknb) share the rows of their target"""
+    __slots__ = ('block_type', 'rows', 'linked')
+
+    def __init__(self, block_type, rows, linked=False):
+        self.block_type = block_type  # value of the 'type' attribute, e.g. 'verse'
+        self.rows = rows  # tuple of RowIR
+        self.linked = linked
+
+    @staticmethod
+    def parseDOM(root):
+        block_type = root.attrib['type']
+        rows = []
+        for child in root.getchildren():
+            if child.tag == '{%s}bis' % NS:
+                bis_rows = [RowIR.parseDOM(row, bis=True) for row in child.findall('{*}row')]
+                bis_rows[-1].bis = int(child.attrib.get('times', '2'))
+                rows += bis_rows
+            else:
+                rows.append(RowIR.parseDOM(child))
+        return BlockIR(block_type, tuple(rows))
+
+    def as_linked(self):
+        return BlockIR(self.block_type, self.rows, linked=True)
+
+
+class SongIR:
+    """Metadata and lyrics of one song file"""
+    __slots__ = ('path', 'title', 'lang', 'xml_lang', 'alias', 'genre', 'artist', 'text_author', 'composer',
+                 'original_title', 'translator', 'comment', 'album', 'music_source', 'metre', 'barre', 'blocks')
+
+    def __init__(self, path='', title=None, lang=None, xml_lang=None, alias=None, genre=None, artist=None,
+                 text_author=None, composer=None, original_title=None, translator=None, comment=None, album=None,
+                 music_source=None, metre=None, barre=None, blocks=()):
+        self.path = path
+        self.title = title
+        self.lang = lang
+        self.xml_lang = xml_lang  # xml:lang of the song, used when lang is missing
+        self.alias = alias
+        self.genre = genre
+        self.artist = artist
+        self.text_author = text_author
+        self.composer = composer
+        self.original_title = original_title
+        self.translator = translator
+        self.comment = comment
+        self.album = album
+        self.music_source = music_source
+        self.metre = metre
+        self.barre = barre
+        self.blocks = blocks  # tuple of BlockIR, in order of appearance (tablatures skipped)
+
+    @staticmethod
+    def parseDOM(root, path=''):
+        def elementTextOrNone(elem):
+            return elem.text if elem is not None else None
+
+        # A child of 'lyric' element may either be a text block, a reference to a text block (e.g. to a chorus), or a tablature.
+        text_blocks = root.findall('{*}lyric/{*}block')
+        parsed = {}
+
+        def block_ir(block):
+            if block not in parsed:
+                parsed[block] = BlockIR.parseDOM(block)
+            return parsed[block]
+
+        def flatten(block):
+            if 'blocknb' not in block.attrib:
+                return block_ir(block)
+            return block_ir(text_blocks[int(block.attrib['blocknb']) - 1]).as_linked()
+
+        blocks = tuple(flatten(block) for block in root.find('{*}lyric').getchildren() if
+                       block.tag != '{%s}tabbs' % NS)
+
+        music = root.find('{*}music')
+        barre = root.xpath("./s:music/s:guitar/@barre", namespaces={"s": NS})
+        return SongIR(
+            path=path,
+            title=root.get('title'),
+            lang=root.get('lang'),
+            xml_lang=root.get('{http://www.w3.org/XML/1998/namespace}lang'),
+            alias=elementTextOrNone(root.find('{*}alias')),
+            genre=elementTextOrNone(root.find('{*}genre')),
+            artist=elementTextOrNone(root.find('{*}artist')),
+            text_author=elementTextOrNone(root.find('{*}text_author')),
+            composer=elementTextOrNone(root.find('{*}composer')),
+            original_title=elementTextOrNone(root.find('{*}original_title')),
+            translator=elementTextOrNone(root.find('{*}translator')),
+            comment=elementTextOrNone(root.find('{*}comment')),
+            album=elementTextOrNone(root.find('{*}album')),
+            music_source=elementTextOrNone(root.find('{*}music_source')),
+            metre=music.get('metre') if music is not None else None,
+            barre=str(barre[0]) if barre else None,
+            blocks=blocks)
+
+
+def parse_song(path):
+    """Parses the song file into a new SongIR"""
+    return SongIR.parseDOM(etree.parse(path).getroot(), path)
+
+
+_songs = {}  # path -> (mtime_ns, size, SongIR)
+
+def load_song(path):
+    """SongIR of the file, loaded once per process (and again only if the file changed)"""
+    from . import song_bundle
+    st = os.stat(path)
+    cached = _songs.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    song = song_bundle.shared_bundle().load(path) or parse_song(path)
+    _songs[path] = (st.st_mtime_ns, st.st_size, song)
+    return song
@@ -6,10 +6,12 @@ based on various criteria like title, artist, genre, glob patterns, etc.
 """
 
 import re
+import glob
 import logging
 import os
 from abc import ABC, abstractmethod
-from pathlib import Path, PurePath
+from functools import lru_cache
+from pathlib import Path, PurePosixPath
 
 
 # ============================================================================
@@ -30,6 +32,17 @@ class Condition(ABC):
             bool: True if value matches the condition
         """
         pass
+    
+    def bitmap(self, column):
+        """Bitmap of songs whose value in the column matches this condition
+        
+        Args:
+            column: song_columns.Column of the field
+            
+        Returns:
+            int: Bitmap with bit i set if song i matches
+        """
+        return column.select(self.matches)
 
 
 class EqualsCondition(Condition):
@@ -47,6 +60,9 @@ class EqualsCondition(Condition):
             return False
         return str(value).strip() == self.target
     
+    def bitmap(self, column):
+        return column.stripped().get(self.target, 0)
+    
     def __repr__(self):
         return f"EqualsCondition('{self.target}')"
 
@@ -92,6 +108,17 @@ class SongMatcher(ABC):
             bool: True if song matches
         """
         pass
+    
+    def bitmap(self, columns):
+        """Bitmap of matching songs
+        
+        Args:
+            columns: song_columns.SongColumns of the songs to check
+            
+        Returns:
+            int: Bitmap with bit i set if columns.songs[i] matches
+        """
+        return columns.bitmap(self.matches)
 
 
 class FieldSongMatcher(SongMatcher):
@@ -129,10 +156,47 @@ class FieldSongMatcher(SongMatcher):
         # All fields in SongMeta return single values (string or None)
         return self.condition.matches(field_value)
     
+    def bitmap(self, columns):
+        return self.condition.bitmap(columns.column(self.field))
+    
     def __repr__(self):
         return f"FieldSongMatcher(field='{self.field}', condition={self.condition})"
 
 
+@lru_cache(maxsize=None)
+def relative_posix_path(song_path, base_dir):
+    """Path of the song relative to base_dir, with forward slashes, or None if unrelated.
+
+    Memoized, as it may need to resolve() the paths (i.e. touch the filesystem)
+    and every song is checked against many glob patterns.
+    """
+    song_path = Path(song_path)
+    base_dir = Path(base_dir)
+    try:
+        rel_path = song_path.relative_to(base_dir)
+    except ValueError:
+        # If song_path is not relative to base_dir, try with absolute paths
+        try:
+            rel_path = song_path.resolve().relative_to(base_dir.resolve())
+        except ValueError:
+            # Paths are unrelated, can't match
+            return None
+    return rel_path.as_posix()
+
+
+def glob_literal_prefix(glob_pattern):
+    """The leading part of a glob pattern without wildcards, up to a segment boundary
+
+    E.g. 'songs/pl/harc/' for 'songs/pl/harc/**/*.xml'. A pattern without
+    wildcards is its own prefix.
+    """
+    segments = glob_pattern.split('/')
+    for i, segment in enumerate(segments):
+        if glob.has_magic(segment):
+            return '/'.join(segments[:i] + [''])
+    return glob_pattern
+
+
 class GlobSongMatcher(SongMatcher):
     """Matches songs based on glob pattern"""
     
@@ -144,6 +208,12 @@ class GlobSongMatcher(SongMatcher):
         """
         self.glob_pattern = glob_pattern
         self.base_dir = Path(base_dir)
+        # Same normalization and translation as PurePath.full_match(), done once.
+        normalized = str(PurePosixPath(glob_pattern))
+        self.normalized_pattern = '' if normalized == '.' else normalized
+        self.regexp = glob.translate(self.normalized_pattern, recursive=True, include_hidden=True, seps='/')
+        self.compiled = re.compile(self.regexp)
+        self.literal_prefix = glob_literal_prefix(self.normalized_pattern)
     
     def matches(self, song):
         """Check if song's file path matches the glob pattern
@@ -154,42 +224,77 @@ class GlobSongMatcher(SongMatcher):
         Returns:
             bool: True if song's plik() matches the glob pattern
         """
+        song_path = song.plik() if hasattr(song, 'plik') else None
+        if song_path is None:
+            return False
+        return self.matches_path(song_path)
+    
+    def matches_path(self, path):
+        """Check if the file path matches the glob pattern"""
         try:
-            song_path = song.plik() if hasattr(song, 'plik') else None
-            if song_path is None:
+            rel_path_str = relative_posix_path(str(path), str(self.base_dir))
+            if rel_path_str is None:
                 return False
             
-            # Convert to Path object
-            song_path = Path(song_path)
-            
-            # Get path relative to base_dir
-            try:
-                rel_path = song_path.relative_to(self.base_dir)
-            except ValueError:
-                # If song_path is not relative to base_dir, try with absolute paths
-                try:
-                    rel_path = song_path.resolve().relative_to(self.base_dir.resolve())
-                except ValueError:
-                    # Paths are unrelated, can't match
-                    return False
-            
-            # Convert to string with forward slashes for consistent matching
-            rel_path_str = rel_path.as_posix()
-            
-            # Use PurePath.match() with the full pattern
-            # We need to check if the relative path matches the pattern
-            r = PurePath(rel_path_str).full_match(self.glob_pattern)
-            # print(f"Matching song path '{rel_path_str}' against pattern '{self.glob_pattern}': {r}")  # Debug
-            return r
+            return rel_path_str.startswith(self.literal_prefix) and self.compiled.match(rel_path_str) is not None
                 
         except Exception as e:
             logging.warning(f"Error checking song path against pattern '{self.glob_pattern}': {e}")
             return False
     
+    def bitmap(self, columns):
+        return columns.column('path').select(lambda path: path is not None and self.matches_path(path))
+    
     def __repr__(self):
         return f"GlobSongMatcher('{self.glob_pattern}')"
 
 
+class GlobSetSongMatcher(SongMatcher):
+    """Matches if any of several glob patterns (sharing one base_dir) matches
+
+    All patterns are compiled into a single regular expression, and songs
+    outside of every literal prefix (e.g. 'songs/pl/harc/') are rejected
+    without running it.
+    """
+
+    def __init__(self, glob_matchers, base_dir):
+        """
+        Args:
+            glob_matchers: List of GlobSongMatcher objects
+            base_dir: Base directory the patterns are relative to
+        """
+        self.glob_matchers = list(glob_matchers)
+        self.base_dir = str(base_dir)
+        prefixes = sorted({m.literal_prefix for m in self.glob_matchers})
+        # Prefixes covered by a shorter prefix are redundant.
+        self.literal_prefixes = tuple(p for i, p in enumerate(prefixes)
+                                      if not any(p.startswith(q) for q in prefixes[:i]))
+        self.compiled = re.compile('|'.join(f'(?:{m.regexp})' for m in self.glob_matchers))
+
+    def matches(self, song):
+        song_path = song.plik() if hasattr(song, 'plik') else None
+        if song_path is None:
+            return False
+        return self.matches_path(song_path)
+
+    def matches_path(self, path):
+        """Check if the file path matches any of the glob patterns"""
+        try:
+            rel_path_str = relative_posix_path(str(path), self.base_dir)
+            if rel_path_str is None or not rel_path_str.startswith(self.literal_prefixes):
+                return False
+            return self.compiled.match(rel_path_str) is not None
+        except Exception as e:
+            logging.warning(f"Error checking song path against {self}: {e}")
+            return False
+
+    def bitmap(self, columns):
+        return columns.column('path').select(lambda path: path is not None and self.matches_path(path))
+
+    def __repr__(self):
+        return f"GlobSetSongMatcher({[m.glob_pattern for m in self.glob_matchers]})"
+
+
 class OrSongMatcher(SongMatcher):
     """Matches if any of the sub-matchers match (OR logic)"""
     
@@ -199,6 +304,7 @@ class OrSongMatcher(SongMatcher):
             matchers: List of SongMatcher objects (optional)
         """
         self.matchers = matchers or []
+        self._plan = None
     
     def add_matcher(self, matcher):
         """Add a matcher to the OR list
@@ -209,12 +315,47 @@ class OrSongMatcher(SongMatcher):
         if not isinstance(matcher, SongMatcher):
             raise TypeError(f"Expected SongMatcher, got {type(matcher)}")
         self.matchers.append(matcher)
+        self._plan = None
+    
+    def compile(self):
+        """Merge glob sub-matchers into GlobSetSongMatchers (one per base_dir)
+
+        Returns:
+            List of matchers equivalent to self.matchers, used by matches()
+        """
+        if self._plan is None:
+            globs_by_dir = {}
+            plan = []
+            for matcher in self.matchers:
+                if isinstance(matcher, GlobSongMatcher):
+                    globs_by_dir.setdefault(str(matcher.base_dir), []).append(matcher)
+                else:
+                    plan.append(matcher)
+            # Glob matchers are cheap, so they go first.
+            self._plan = [GlobSetSongMatcher(globs, base_dir) for base_dir, globs in globs_by_dir.items()] + plan
+        return self._plan
     
     def matches(self, song):
         """Check if any matcher matches the song"""
         if not self.matchers:
             return False
-        return any(matcher.matches(song) for matcher in self.matchers)
+        return any(matcher.matches(song) for matcher in self.compile())
+    
+    def bitmap(self, columns):
+        result = 0
+        for matcher in self.compile():
+            result |= matcher.bitmap(columns)
+        return result
+    
+    def glob_patterns(self):
+        """Glob patterns of the sub-matchers, or None if there are other (field) matchers
+
+        When only globs are used, the matching songs can be found by walking
+        just the directories the patterns point to.
+        """
+        if not all(isinstance(matcher, GlobSongMatcher) for matcher in self.matchers):
+            return None
+        return [matcher.glob_pattern for matcher in self.matchers]
     
     def __repr__(self):
         return f"OrSongMatcher({len(self.matchers)} matchers)"
@@ -246,6 +387,12 @@ class AndSongMatcher(SongMatcher):
             return True
         return all(matcher.matches(song) for matcher in self.matchers)
     
+    def bitmap(self, columns):
+        result = columns.all
+        for matcher in self.matchers:
+            result &= matcher.bitmap(columns)
+        return result
+    
     def __repr__(self):
         return f"AndSongMatcher({len(self.matchers)} matchers)"
 
@@ -335,5 +482,6 @@ def parse_songs_spec(songs_spec, base_dir):
         except Exception as e:
             logging.error(f"Unexpected error parsing matcher #{i+1}: {e}")
     
+    or_matcher.compile()
     logging.info(f"Parsed {len(or_matcher.matchers)} matchers from songs specification")
     return or_matcher
\ No newline at end of file
@@ -3,8 +3,9 @@ import glob, os
 import uuid
 import hashlib
 import logging
-import src.lib.list_of_songs as loslib
 from src.lib.song_matchers import parse_songs_spec
+import src.lib.song_corpus as song_corpus
+import src.lib.collation as collation
 
 def repo_dir():
     return os.path.dirname(os.path.realpath(__file__))+"/../.."
@@ -26,32 +27,38 @@ class SongbookSpec:
     self.spec = spec["songbook"]
     self.basedir = os.path.dirname(specFile)
     self.specFile = specFile
+    self._matcher = None
 
   def __str__(self):
       return str(self.spec)
 
-  def list_of_songs(self):
-      """Get list of songs matching the songbook's criteria"""
+  def matcher(self):
+      """OrSongMatcher parsed from the songbook's songs specification"""
+      if self._matcher is None:
+          self._matcher = parse_songs_spec(self.spec.get("songs"), base_dir=repo_dir())
+      return self._matcher
+
+  def list_of_songs(self, corpus=None):
+      """Get list of songs matching the songbook's criteria
+
+      Args:
+          corpus: SongCorpus to select songs from (defaults to the process-wide one)
+      """
       if "songs" not in self.spec:
           logging.warning(f"No songs specification in songbook '{self.title()}'")
           return []
-      
-      # Parse the songs specification into an OrSongMatcher
-      or_matcher = parse_songs_spec(self.spec["songs"], base_dir=repo_dir())
-      
-      logging.info(f"Loading songs for songbook '{self.title()}' with {len(or_matcher.matchers)} matchers")
-      
-      all_songs = loslib.list_of_song_from_globs(["songs/**/*.xml"], base_dir=repo_dir())
-      logging.info(f"Filtering {len(all_songs)} total songs")
-      
-      matching_songs = [song for song in all_songs if or_matcher.matches(song)]
-      
-      logging.info(f"Found {len(matching_songs)} matching songs for '{self.title()}'")
-      return matching_songs
+
+      if corpus is None:
+          corpus = song_corpus.shared_corpus(repo_dir())
+      return corpus.songs_for(self)
 
   def title(self):
       return self.spec["title"] if "title" in self.spec else "Śpiewnik"
 
+  def locale(self):
+      """ICU locale used for ordering the songbook's songs"""
+      return self.spec["locale"] if "locale" in self.spec else collation.DEFAULT_LOCALE
+
   def subtitle(self):
       return self.spec["subtitle"] if "subtitle" in self.spec else ""
 
@@ -109,9 +116,29 @@ def load_songbook_spec_from_yaml(filename, title=None, songFiles=None):
         if title:
             songbook["songbook"]["title"] = title
         if songFiles:
-            songbook["songbook"]["songs"] = map(lambda s: {"glob": s}, songFiles)
+            songbook["songbook"]["songs"] = [{"glob": s} for s in songFiles]
         return SongbookSpec(songbook, specFile=os.path.abspath(filename))
 
+_songbooks = None
+
 def songbooks():
-    logging.info("searching: " + os.path.join(repo_dir(), "songbooks/*.yaml"))
-    return map(load_songbook_spec_from_yaml, glob.glob(os.path.join(repo_dir(), "songbooks/*.yaml")))
+    """All SongbookSpecs of songbooks/*.yaml, loaded once per process"""
+    global _songbooks
+    if _songbooks is None:
+        logging.info("searching: " + os.path.join(repo_dir(), "songbooks/*.yaml"))
+        _songbooks = list(map(load_songbook_spec_from_yaml, glob.glob(os.path.join(repo_dir(), "songbooks/*.yaml"))))
+    return _songbooks
+
+def resolve_songbooks(specs=None, corpus=None):
+    """Songs of the given songbooks, resolved together in one corpus pass
+
+    Args:
+        specs: SongbookSpecs to resolve (defaults to all songbooks())
+        corpus: SongCorpus to select songs from (defaults to the process-wide one)
+
+    Returns:
+        SongbookMembership; songs are matched lazily, on first use
+    """
+    if corpus is None:
+        corpus = song_corpus.shared_corpus(repo_dir())
+    return corpus.resolve(songbooks() if specs is None else specs)
@@ -0,0 +1,144 @@
+"""
+Content-addressed, on-disk cache of the LaTeX rendered for single songs.
+
+A fragment is keyed by the SHA-1 of the song file together with all inputs
+of the rendering (template and code), so it is valid for every songbook and
+paper size, and even for copies of the song in other checkouts sharing the
+cache directory.
+
+Fragments get their modification time refreshed whenever they are read, and
+prune() removes the ones unused for MAX_AGE_DAYS, so fragments of old versions
+of songs and templates don't pile up.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+
+# Fragments not used for this long are removed by prune().
+MAX_AGE_DAYS = 30
+
+# Temporary files older than this are left over by a crashed process.
+_TMP_MAX_AGE = 3600
+
+# The cache is pruned at most this often, as it needs to stat every fragment.
+_PRUNE_INTERVAL = 24 * 3600
+
+
+class TexFragmentCache:
+    """Rendered LaTeX of songs, stored as <cache_dir>/<key[:2]>/<key>.tex"""
+
+    def __init__(self, cache_dir, inputs, versions=()):
+        """
+        Args:
+            cache_dir: Directory of the cache (created on first store)
+            inputs: Files (template, code) whose content affects the rendered LaTeX
+            versions: Versions of libraries (e.g. Jinja2) which affect the rendered LaTeX
+        """
+        self.cache_dir = cache_dir
+        salt = hashlib.sha1()
+        for path in inputs:
+            with open(path, "rb") as f:
+                salt.update(hashlib.sha1(f.read()).digest())
+        for version in versions:
+            salt.update(version.encode("utf-8") + b"\0")
+        self._salt = salt.digest()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, path):
+        """Cache key of the song file"""
+        with open(path, "rb") as f:
+            return hashlib.sha1(self._salt + f.read()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".tex")
+
+    def get(self, key):
+        """Cached fragment, or None (counting hits and misses)"""
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                tex = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(key)
+        return tex
+
+    def _touch(self, key):
+        """Marks the fragment as used, see prune()"""
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def missing(self, keys):
+        """Indices of the keys without a cached fragment (counted as misses)
+
+        This lets callers start rendering the missing fragments before reading
+        the cached ones one by one with get().
+        """
+        missing = [i for i, key in enumerate(keys) if not os.path.exists(self._path(key))]
+        self.misses += len(missing)
+        return missing
+
+    def put(self, key, tex):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first, so parallel jobs never see a half-written fragment.
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        except OSError:
+            return  # the cache is only an optimization
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(tex)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+        finally:
+            # Only left if writing or renaming it failed.
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def prune(self, max_age_days=MAX_AGE_DAYS, force=False):
+        """Removes fragments unused for max_age_days and leftover temporary files; returns their number
+
+        Unless forced, does nothing if the cache was pruned less than a day ago.
+        """
+        marker = os.path.join(self.cache_dir, ".pruned")
+        now = time.time()
+        try:
+            if not force and now - os.stat(marker).st_mtime < _PRUNE_INTERVAL:
+                return 0
+        except OSError:
+            pass  # never pruned
+        removed = 0
+        try:
+            subdirs = [entry.path for entry in os.scandir(self.cache_dir) if entry.is_dir()]
+        except OSError:
+            return 0  # no cache yet
+        for subdir in subdirs:
+            try:
+                entries = list(os.scandir(subdir))
+            except OSError:
+                continue
+            for entry in entries:
+                max_age = _TMP_MAX_AGE if entry.name.endswith(".tmp") else max_age_days * 24 * 3600
+                try:
+                    if now - entry.stat().st_mtime > max_age:
+                        os.remove(entry.path)
+                        removed += 1
+                except OSError:
+                    pass  # removed by a parallel job
+        try:
+            with open(marker, "w"):
+                pass
+        except OSError:
+            pass
+        return removed
+
+    def __str__(self):
+        return f"TeX fragment cache {self.cache_dir}: {self.hits} hits, {self.misses} misses"
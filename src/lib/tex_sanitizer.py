@@ -0,0 +1,120 @@
+"""
+Table-driven sanitization of text for the LaTeX output.
+
+The tables are plain data, so other outputs (HTML, EPUB) can reuse them:
+    TEX_ESCAPES             - LaTeX special characters (and '...') to LaTeX code
+    CHARACTER_REPLACEMENTS  - characters the LaTeX fonts can't render, with their
+                              replacements ('' drops the character)
+    UNSUPPORTED_SCRIPTS     - character ranges for which a song can't be typeset
+
+tex_escape() escapes a string in one regex pass. sanitize() applies all
+CHARACTER_REPLACEMENTS and detects unsupported scripts in one regex pass,
+reporting the offending character.
+"""
+
+import re
+import unicodedata
+
+TEX_ESCAPES = {
+    '&': r'\&',
+    '"': "''",
+    '%': r'\%',
+    '$': r'\$',
+    '#': r'\#',
+    '_': r'\_',
+    '{': r'\{',
+    '}': r'\}',
+    '~': r'\textasciitilde{}',
+    '^': r'\^{}',
+    '\\': r'\textbackslash{}',
+    '<': r'\textless{}',
+    '>': r'\textgreater{}',
+    '...': r'{\dots}'
+}
+
+# Sequences like U+FE0F U+2B07 (arrow with emoji presentation) need no entries
+# of their own: the variation selector is dropped and the arrow replaced.
+CHARACTER_REPLACEMENTS = {
+    '\uFEFF': ' ',  # zero width no-break space (BOM)
+    '\u0435': 'e',  # Cyrillic small letter ie, looking like 'e'
+    '\u1E57': 'p',  # p with dot above
+    '\u2033': '"',  # double prime
+    '\u2032': "'",  # prime
+    '\u2212': '-',  # minus sign
+    # Arrows
+    '\u25BC': r'$\downarrow$', '\u2B07': r'$\downarrow$', '\U0001F53D': r'$\downarrow$',
+    '\u25B2': r'$\uparrow$', '\u2B06': r'$\uparrow$', '\U0001F53C': r'$\uparrow$',
+    # Control characters
+    '\u001B': '', '\u001E': '', '\u007F': '',
+    '\u0080': '', '\u0081': '', '\u0082': '', '\u0084': '', '\u0085': '', '\u0087': '', '\u0088': '',
+    '\u0091': '', '\u0092': '', '\u0093': '', '\u0094': '', '\u0095': '', '\u0096': '', '\u0098': '',
+    '\u0099': '', '\u009B': '', '\u009C': '', '\u009F': '',
+    # Spaces and invisible characters
+    '\u200B': '', '\u2003': '', '\u2005': '', '\u2009': '', '\u2028': '', '\u205F': '', '\u3164': '',
+    '\uFE0F': '',  # variation selector (emoji presentation)
+    '\uFFFC': '',  # object replacement character
+    '\uFFFD': '',  # replacement character
+    # Other characters
+    '\u02B9': '', '\u02BC': '', '\u2075': '', '\u2502': '', '\u99C9': '',
+    '\U0001F637': '', '\U0001F642': '',  # emoji
+}
+
+UNSUPPORTED_SCRIPTS = [
+    ('Greek and combining marks', '\u0300', '\u03FF'),
+    ('Cyrillic', '\u0400', '\u04FF'),
+    ('Cyrillic Supplement, Armenian and Hebrew', '\u0500', '\u05FF'),
+    ('Myanmar and Georgian', '\u1000', '\u10FF'),
+    ('Miscellaneous Symbols', '\u2600', '\u26FF'),
+    ('CJK Symbols, Hiragana and Katakana', '\u3000', '\u30FF'),
+    ('CJK Unified Ideographs', '\u5000', '\u50FF'),
+    ('CJK Unified Ideographs', '\u6600', '\u66FF'),
+    ('CJK Unified Ideographs', '\u8A00', '\u8AFF'),
+]
+
+_ESCAPE_RE = re.compile('|'.join(re.escape(key) for key in sorted(TEX_ESCAPES, key=lambda item: - len(item))))
+# Characters to replace, followed by the unsupported ranges: a replaced character is never unsupported.
+_SANITIZE_RE = re.compile('[' + ''.join(re.escape(char) for char in CHARACTER_REPLACEMENTS) +
+                          ''.join(f'{first}-{last}' for _, first, last in UNSUPPORTED_SCRIPTS) + ']')
+
+
+def tex_escape(text):
+    """
+        :param text: a plain text message
+        :return: the message escaped to appear correctly in LaTeX
+    """
+    if text:
+        return _ESCAPE_RE.sub(lambda match: TEX_ESCAPES[match.group()], text)
+    else:
+        return text
+
+
+def unsupported_script(char):
+    """Name of the UNSUPPORTED_SCRIPTS range of the character, or None"""
+    for name, first, last in UNSUPPORTED_SCRIPTS:
+        if first <= char <= last:
+            return name
+    return None
+
+
+def sanitize(text):
+    """Replaces CHARACTER_REPLACEMENTS in the text and checks it for unsupported scripts, in one pass.
+
+    Returns:
+        (sanitized text, None), or (sanitized text, reason) if the text can't be typeset
+    """
+    unsupported = []
+
+    def replace(match):
+        char = match.group()
+        if char in CHARACTER_REPLACEMENTS:
+            return CHARACTER_REPLACEMENTS[char]
+        unsupported.append(match.start())
+        return char
+
+    text_out = _SANITIZE_RE.sub(replace, text)
+    if unsupported:
+        char = text[unsupported[0]]
+        line = text.count('\n', 0, unsupported[0]) + 1
+        return text_out, (f"unsupported {unsupported_script(char)} character {char!r} "
+                          f"(U+{ord(char):04X} {unicodedata.name(char, '?')}) in line {line}")
+    return text_out, None
@@ -0,0 +1,191 @@
+"""Renders the PDFs (a4 and a5) and EPUBs of all songbooks on a pool of workers.
+
+Every job runs render_pdf.sh or render_epub.sh (followed by epubcheck) in a
+process of its own, so a failing job doesn't affect the others; its output
+goes to build/logs/<job>.log. Jobs are started longest first: by their wall
+time in the previous run (kept in the build cache directory), or else by the
+number of songs of the songbook. The pool is sized to the CPU cores and the
+available memory, and a summary of wall times and failures is printed at the
+end.
+
+Usage: python3 src/render_scheduler.py [--pdf] [--epub] [--jobs N] [songbook.yaml ...]
+    (both PDFs and EPUBs of songbooks/*.yaml by default)
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import src.lib.list_of_songs as loslib
+import src.lib.song_bundle as song_bundle
+import src.lib.songbook as sb
+
+PAPERSIZES = ["a4", "a5"]
+
+# Rough peak memory of a render job (Python generation, then pdflatex), for sizing the pool.
+MEMORY_PER_JOB = 768 * 2**20
+
+# Without timings of a previous run, a PDF job is estimated to take this many times an EPUB job.
+PDF_COST = 4
+
+
+class RenderJob:
+    """One render of a songbook: a sequence of commands run in its own processes"""
+
+    def __init__(self, name, commands, estimate):
+        self.name = name
+        self.commands = commands
+        self.estimate = estimate
+        self.wall_time = None
+        self.error = None
+
+    def run(self, log_dir, env):
+        log_path = os.path.join(log_dir, self.name + ".log")
+        start = time.perf_counter()
+        with open(log_path, "w") as log:
+            for command in self.commands:
+                program = os.path.basename(command[1] if command[0] == "bash" else command[0])
+                try:
+                    result = subprocess.run(command, cwd=sb.repo_dir(), env=env, stdout=log, stderr=subprocess.STDOUT)
+                except OSError as e:
+                    # E.g. java or epubcheck not installed; only this job fails.
+                    self.error = f"{program} couldn't be run: {e}"
+                    break
+                if result.returncode != 0:
+                    self.error = f"{program} exited with {result.returncode}, see {log_path}"
+                    break
+        self.wall_time = time.perf_counter() - start
+        return self
+
+
+def epubcheck_command(epub):
+    if os.path.exists("/opt/homebrew/bin/epubcheck"):
+        return ["epubcheck", epub]
+    return ["java", "-jar", "/usr/bin/epubcheck", epub]
+
+
+def songbook_jobs(songbook, songs, pdf=True, epub=True):
+    """RenderJobs of the SongbookSpec, with estimates from its number of songs"""
+    songbook_file = songbook.specFile
+    repo = sb.repo_dir()
+    jobs = []
+    if pdf:
+        for papersize in PAPERSIZES:
+            jobs.append(RenderJob(f"{songbook.id()}_{papersize}",
+                                  [["bash", os.path.join(repo, "render_pdf.sh"), papersize, songbook_file]],
+                                  songs * PDF_COST))
+    if epub:
+        jobs.append(RenderJob(f"{songbook.id()}_epub",
+                              [["bash", os.path.join(repo, "render_epub.sh"), songbook_file],
+                               epubcheck_command(os.path.join(repo, "build", songbook.id() + ".epub"))],
+                              songs))
+    return jobs
+
+
+def available_memory():
+    """MemAvailable of /proc/meminfo in bytes (free memory plus reclaimable caches), or None if unknown"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass  # not Linux
+    return None
+
+
+def default_workers():
+    """Number of parallel jobs fitting the CPU cores and the available memory"""
+    workers = os.cpu_count() or 1
+    available = available_memory()
+    if available is not None:
+        workers = min(workers, available // MEMORY_PER_JOB)
+    return max(1, workers)
+
+
+def _timings_path():
+    return os.path.join(loslib.default_cache_dir(), "render_times.json")
+
+
+def load_timings():
+    try:
+        with open(_timings_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_timings(jobs):
+    timings = load_timings()
+    timings.update({job.name: job.wall_time for job in jobs if job.wall_time is not None and not job.error})
+    os.makedirs(os.path.dirname(_timings_path()), exist_ok=True)
+    with open(_timings_path(), "w") as f:
+        json.dump(timings, f, indent=1, sort_keys=True)
+
+
+def run_jobs(jobs, workers, log_dir):
+    """Runs the jobs, longest first, on a pool of workers; returns them in the order they finished"""
+    timings = load_timings()
+    jobs = sorted(jobs, key=lambda job: timings.get(job.name, job.estimate), reverse=True)
+    # Jobs already run in parallel, so each one's own worker processes would only compete for the cores.
+    env = dict(os.environ)
+    env.setdefault("SONGBOOK_JOBS", "1")
+    os.makedirs(log_dir, exist_ok=True)
+    finished = []
+    # Threads only wait for the job processes.
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Submitted in order, so that the longest jobs start first.
+        futures = [pool.submit(job.run, log_dir, env) for job in jobs]
+        for future in as_completed(futures):
+            job = future.result()
+            print(f"{'FAILED' if job.error else 'done':>6} {job.name} ({job.wall_time:.1f}s)", file=sys.stderr)
+            finished.append(job)
+    save_timings(finished)
+    return finished
+
+
+def summary(jobs, wall_time):
+    lines = [f"{len(jobs)} jobs in {wall_time:.1f}s:"]
+    for job in sorted(jobs, key=lambda job: job.wall_time, reverse=True):
+        lines.append(f"  {job.name:<40} {job.wall_time:8.1f}s  {'FAILED: ' + job.error if job.error else 'ok'}")
+    failed = [job for job in jobs if job.error]
+    lines.append(f"{len(failed)} failed" if failed else "All jobs succeeded")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render PDFs and EPUBs of songbooks in parallel")
+    parser.add_argument("--pdf", action="store_true", help="Render PDFs (a4 and a5)")
+    parser.add_argument("--epub", action="store_true", help="Render EPUBs")
+    parser.add_argument("--jobs", type=int, default=None, help="Number of parallel jobs (default: fits cores and memory)")
+    parser.add_argument("songbooks", nargs="*", help="Songbook specs (default: songbooks/*.yaml)")
+    args = parser.parse_args()
+    pdf, epub = (args.pdf, args.epub) if args.pdf or args.epub else (True, True)
+    songbook_files = args.songbooks or sorted(glob.glob(os.path.join(sb.repo_dir(), "songbooks", "*.yaml")))
+
+    # Compile songs once, so that no job parses the song XML files.
+    files = loslib.files_from_globs(["songs/**/*.xml"], sb.repo_dir())
+    song_bundle.compile_bundle(files, sb.repo_dir(), song_bundle.default_bundle_path())
+
+    # All songbooks are resolved together, in one pass over the corpus.
+    membership = sb.resolve_songbooks([sb.load_songbook_spec_from_yaml(f) for f in songbook_files])
+    jobs = []
+    for songbook in membership.songbooks:
+        songs = sum(1 for song in membership.songs_of(songbook) if not song.is_alias())
+        jobs += songbook_jobs(songbook, songs, pdf, epub)
+    workers = args.jobs or default_workers()
+    print(f"Rendering {len(jobs)} jobs with {workers} workers", file=sys.stderr)
+    start = time.perf_counter()
+    finished = run_jobs(jobs, workers, os.path.join(sb.repo_dir(), "build", "logs"))
+    print(summary(finished, time.perf_counter() - start), file=sys.stderr)
+    if any(job.error for job in finished):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
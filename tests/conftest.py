@@ -0,0 +1,27 @@
+import glob
+import os
+
+import pytest
+
+import src.lib.song_corpus as song_corpus
+import src.lib.songbook as sb
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Build caches of every test go to a directory of its own, not to build/cache"""
+    path = tmp_path / "cache"
+    monkeypatch.setenv("SONGBOOK_CACHE_DIR", str(path))
+    return path
+
+
+@pytest.fixture(scope="session")
+def song_files():
+    """All song files of the repository"""
+    return sorted(glob.glob(os.path.join(sb.repo_dir(), "songs/**/*.xml"), recursive=True))
+
+
+@pytest.fixture(scope="session")
+def corpus():
+    """SongCorpus of all songs of the repository"""
+    return song_corpus.SongCorpus(sb.repo_dir())
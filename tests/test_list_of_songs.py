@@ -0,0 +1,8 @@
+import src.lib.list_of_songs as loslib
+
+
+def test_parallel_parse_matches_serial(song_files):
+    serial = loslib.load_song_metas(song_files, cache=False, jobs=1)
+    parallel = loslib.load_song_metas(song_files, cache=False, jobs=2)
+    assert [song.plik() for song in parallel] == song_files
+    assert [song.to_dict() for song in parallel] == [song.to_dict() for song in serial]
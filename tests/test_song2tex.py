@@ -0,0 +1,42 @@
+import io
+
+import pytest
+
+import song2tex as s2t
+import songbook2tex as sb2t
+
+
+@pytest.fixture(autouse=True)
+def fragment_cache(monkeypatch):
+    """A fragment cache in the test's cache directory"""
+    monkeypatch.setattr(s2t, "_fragment_cache", None)
+
+
+@pytest.fixture(scope="module")
+def paths(song_files):
+    # Enough songs for iter_render_songs_tex() to use a pool.
+    return song_files[::10]
+
+
+@pytest.fixture(scope="module")
+def expected(paths):
+    return [s2t.render_song_tex(path)[0] for path in paths]
+
+
+def test_streamed_songs_match_rendered_ones(paths, expected):
+    assert list(s2t.iter_songs_tex(paths, cache=False, jobs=1)) == expected
+    assert list(s2t.iter_songs_tex(paths, cache=False, jobs=2)) == expected
+
+
+def test_cached_fragments_match_rendered_ones(paths, expected):
+    assert list(s2t.iter_songs_tex(paths, jobs=1)) == expected
+    assert s2t.fragment_cache().misses == len(paths)
+    assert list(s2t.iter_songs_tex(paths, jobs=1)) == expected
+    assert s2t.fragment_cache().hits == len(paths)
+
+
+def test_write_tex_writes_chunks_in_order(paths, expected):
+    out = io.StringIO()
+    sb2t.write_tex(iter(["header\n"] + expected + ["footer\n"]), out)
+    # Followed by the newline print() used to add to the whole document.
+    assert out.getvalue() == "header\n" + "".join(expected) + "footer\n\n"
@@ -0,0 +1,55 @@
+import os
+import shutil
+
+import src.lib.song_bundle as song_bundle
+import src.lib.song_ir as song_ir
+import src.lib.songbook as sb
+
+
+def ir_fields(song):
+    """Comparable content of a SongIR"""
+    return ([getattr(song, name) for name in song_ir.SongIR.__slots__ if name != "blocks"],
+            [(block.block_type, block.linked, [tuple(getattr(row, name) for name in song_ir.RowIR.__slots__)
+                                               for row in block.rows]) for block in song.blocks])
+
+
+def test_bundle_holds_every_song(song_files, cache_dir):
+    path = str(cache_dir / "corpus.bin")
+    assert song_bundle.compile_bundle(song_files, sb.repo_dir(), path) == (0, len(song_files))
+    bundle = song_bundle.SongBundle(path, sb.repo_dir())
+    assert len(bundle) == len(song_files)
+    for file in song_files:
+        song = bundle.load(file)
+        assert ir_fields(song) == ir_fields(song_ir.parse_song(file)), file
+        # Linked blocks still share their rows.
+        for block in song.blocks:
+            if block.linked:
+                assert any(block.rows is other.rows for other in song.blocks if not other.linked), file
+    # Nothing changed, so nothing is parsed again.
+    assert song_bundle.compile_bundle(song_files, sb.repo_dir(), path) == (len(song_files), 0)
+
+
+def test_changed_songs_are_recompiled(song_files, tmp_path, cache_dir):
+    songs = tmp_path / "songs"
+    songs.mkdir()
+    files = [shutil.copy(file, songs) for file in song_files[:3]]
+    path = str(cache_dir / "corpus.bin")
+    song_bundle.compile_bundle(files, str(tmp_path), path)
+
+    # A touched file is checked by its content, an edited one is stale.
+    os.utime(files[0], ns=(0, 0))
+    with open(files[1], "a", encoding="utf-8") as f:
+        f.write("\n")
+    bundle = song_bundle.SongBundle(path, str(tmp_path))
+    assert bundle.load(files[0]) is not None
+    assert bundle.load(files[1]) is None
+    assert bundle.load(str(tmp_path / "missing.xml")) is None
+    assert song_bundle.compile_bundle(files[:2], str(tmp_path), path) == (1, 1)
+    assert len(song_bundle.SongBundle(path, str(tmp_path))) == 2
+
+
+def test_broken_bundle_is_ignored(tmp_path):
+    path = tmp_path / "corpus.bin"
+    path.write_bytes(song_bundle.MAGIC + b"\xff\xff")
+    assert len(song_bundle.SongBundle(str(path), sb.repo_dir())) == 0
+    assert len(song_bundle.SongBundle(str(tmp_path / "missing.bin"), sb.repo_dir())) == 0
@@ -0,0 +1,58 @@
+import pytest
+
+import src.lib.collation as collation
+import src.lib.song_corpus as song_corpus
+import src.lib.songbook as sb
+
+
+def described(songs):
+    """Comparable description of SongMeta/AliasMeta objects of different corpora"""
+    return [(song.is_alias(), song.effectiveTitle(), song.base_file_name()) for song in songs]
+
+
+def test_shared_corpus_is_loaded_once():
+    assert song_corpus.shared_corpus(sb.repo_dir()) is song_corpus.shared_corpus(sb.repo_dir())
+
+
+def test_songs_are_sorted_with_aliases(corpus, song_files):
+    songs = corpus.songs()
+    assert len([song for song in songs if not song.is_alias()]) == len(song_files)
+    assert [song.sort_key() for song in songs] == sorted(song.sort_key() for song in songs)
+
+
+@pytest.mark.parametrize("songbook", sb.songbooks(), ids=lambda songbook: songbook.id())
+def test_songs_for_matches_the_matcher(corpus, songbook):
+    expected = [song for song in corpus.songs() if songbook.matcher().matches(song)]
+    if songbook.locale() != collation.DEFAULT_LOCALE:
+        expected = collation.sort_songs(expected, songbook.locale())
+    assert corpus.songs_for(songbook) == expected
+    assert corpus.songs_for(songbook) is corpus.songs_for(songbook)
+
+
+@pytest.mark.parametrize("songbook", [songbook for songbook in sb.songbooks() if songbook.matcher().glob_patterns()],
+                         ids=lambda songbook: songbook.id())
+def test_songs_for_without_loading_the_corpus(corpus, songbook):
+    fresh = song_corpus.SongCorpus(sb.repo_dir())
+    songs = fresh.songs_for(songbook)
+    # Only the files matching the globs were parsed.
+    assert fresh._songs is None
+    assert described(songs) == described(corpus.songs_for(songbook))
+
+
+def test_membership_resolves_songbooks_together():
+    corpus = song_corpus.SongCorpus(sb.repo_dir())
+    membership = corpus.resolve(sb.songbooks())
+    for songbook in membership.songbooks:
+        expected = [song for song in corpus.songs() if songbook.matcher().matches(song)]
+        if songbook.locale() != collation.DEFAULT_LOCALE:
+            expected = collation.sort_songs(expected, songbook.locale())
+        assert membership.songs_of(songbook) == expected
+        # Shared with the corpus, so songs_for() doesn't match the songs again.
+        assert corpus.songs_for(songbook) is membership.songs_of(songbook)
+
+
+def test_songbooks_of_is_the_inverse_of_songs_of(corpus):
+    membership = corpus.resolve(sb.songbooks())
+    for song in corpus.songs():
+        assert membership.songbooks_of(song) == \
+            [songbook for songbook in membership.songbooks if song in membership.songs_of(songbook)]
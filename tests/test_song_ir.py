@@ -0,0 +1,62 @@
+import os
+
+import src.lib.list_of_songs as loslib
+import src.lib.read_song_xml as rsx
+import src.lib.song_ir as song_ir
+
+SONG = """<?xml version="1.0" encoding="UTF-8"?>
+<song xmlns="http://21wdh.staszic.waw.pl" title="Piosenka" xml:lang="en">
+  <artist>Ktoś</artist>
+  <music metre="3/4"><guitar barre="2"/></music>
+  <lyric>
+    <block type="verse">
+      <row>Bez akordów</row>
+      <row important_over="true">Przed <ch a="a"/>po a<ch a="C"/></row>
+      <bis times="3"><row style="instr"><ch a="E"/></row><row>raz</row></bis>
+    </block>
+    <block type="chorus"><row sidechords="a C">Ref</row></block>
+    <tabbs>tabulatura</tabbs>
+    <blocklink blocknb="2"/>
+  </lyric>
+</song>
+"""
+
+
+def write_song(tmp_path, content=SONG):
+    path = str(tmp_path / "song.xml")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+
+def test_parse_song(tmp_path):
+    song = song_ir.parse_song(write_song(tmp_path))
+    assert (song.title, song.lang, song.xml_lang, song.artist) == ("Piosenka", None, "en", "Ktoś")
+    assert (song.metre, song.barre) == ("3/4", "2")
+    # The tablature is skipped, the link shares the rows of the chorus.
+    assert [(block.block_type, block.linked) for block in song.blocks] == \
+        [("verse", False), ("chorus", False), ("chorus", True)]
+    assert song.blocks[2].rows is song.blocks[1].rows
+    verse = song.blocks[0].rows
+    assert [(row.text, row.chunks) for row in verse[:2]] == \
+        [("Bez akordów", ()), ("Przed ", (("a", "po a"), ("C", None)))]
+    assert verse[1].important_over and not verse[0].important_over
+    assert [(row.bis, row.instr) for row in verse[2:]] == [(True, True), (3, False)]
+    assert song.blocks[1].rows[0].sidechords == "a C"
+
+
+def test_backends_of_every_song(song_files):
+    for path in song_files:
+        song = song_ir.parse_song(path)
+        assert loslib.SongMeta.fromIR(song).to_dict() == loslib.SongMeta.parseFile(path).to_dict(), path
+        html_song = rsx.Song.fromIR(song)
+        assert len(html_song.blocks) == len(song.blocks), path
+
+
+def test_load_song_reparses_changed_files(tmp_path):
+    path = write_song(tmp_path)
+    song = song_ir.load_song(path)
+    assert song_ir.load_song(path) is song
+    write_song(tmp_path, SONG.replace('title="Piosenka"', 'title="Inna piosenka"'))
+    os.utime(path, ns=(0, 0))
+    assert song_ir.load_song(path).title == "Inna piosenka"
@@ -0,0 +1,66 @@
+import os
+from pathlib import PurePath
+
+import pytest
+
+import src.lib.songbook as sb
+from src.lib.song_matchers import AndSongMatcher, GlobSongMatcher, OrSongMatcher, parse_song_matcher
+
+GLOB_PATTERNS = [
+    "songs/**/*.xml",
+    "**/*.xml",
+    "songs/**",
+    "songs/pl/*/*.xml",
+    "songs/pl/harc/*.xml",
+    "songs/pl/harc/**/*.xml",
+    "songs/**/Bar*.xml",
+    "songs/pl/[a-h]*/*.xml",
+    "songs/*/pop/*.xml",
+    "./songs/en/*.xml",
+    "songs/en/A_Wee_drap_O_Whisky.xml",
+    "songs/pl/harc",
+]
+
+
+@pytest.mark.parametrize("pattern", GLOB_PATTERNS)
+def test_glob_matches_like_full_match(corpus, pattern):
+    matcher = GlobSongMatcher(pattern, sb.repo_dir())
+    for song in corpus.songs():
+        if not song.is_alias():
+            rel_path = os.path.relpath(song.plik(), sb.repo_dir())
+            assert matcher.matches(song) == PurePath(rel_path).full_match(pattern), rel_path
+
+
+@pytest.mark.parametrize("songbook", sb.songbooks() + [None], ids=lambda songbook: songbook.id() if songbook else "globs")
+def test_compiled_plan_matches_like_its_matchers(corpus, songbook):
+    matcher = songbook.matcher() if songbook else \
+        OrSongMatcher([GlobSongMatcher(pattern, sb.repo_dir()) for pattern in GLOB_PATTERNS[3:]])
+    for song in corpus.songs():
+        assert matcher.matches(song) == any(m.matches(song) for m in matcher.matchers), song
+
+
+FIELD_SPECS = [
+    {"title": {"equals": "Piosenka bez tytułu"}},
+    {"title": {"regexp": "(?i)^k"}},
+    {"genre": {"equals": " Country "}},
+    {"genre": {"regexp": ".*"}},
+    {"artist": {"regexp": "(?i)starzec|kaczmarski"}},
+    {"lang": {"equals": "en"}},
+    {"text_author": {"regexp": "Poniedzielski"}},
+    {"text_author": {"equals": ""}},
+]
+
+
+def matchers():
+    """Matchers of the songbooks and of each kind of condition, also combined"""
+    fields = [parse_song_matcher(spec, sb.repo_dir()) for spec in FIELD_SPECS]
+    combined = AndSongMatcher([parse_song_matcher({"lang": {"equals": "pl"}}, sb.repo_dir()),
+                               GlobSongMatcher("songs/pl/harc/**/*.xml", sb.repo_dir()),
+                               OrSongMatcher(fields[:3])])
+    return [songbook.matcher() for songbook in sb.songbooks()] + fields + [combined, OrSongMatcher()]
+
+
+@pytest.mark.parametrize("matcher", matchers(), ids=repr)
+def test_bitmap_selects_matching_songs(corpus, matcher):
+    columns = corpus.columns()
+    assert columns.select(matcher.bitmap(columns)) == [song for song in corpus.songs() if matcher.matches(song)]
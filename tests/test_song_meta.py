@@ -0,0 +1,34 @@
+from lxml import etree
+import pytest
+
+from src.lib.list_of_songs import SongMeta
+
+
+def full_parse(path):
+    return SongMeta.parseDOM(etree.parse(path).getroot(), path)
+
+
+def test_header_parse_matches_full_parse(song_files):
+    mismatches = [path for path in song_files
+                  if SongMeta.parseFile(path).to_dict() != full_parse(path).to_dict()]
+    assert mismatches == []
+
+
+HEAD = '<?xml version="1.0" encoding="UTF-8"?>\n<song xmlns="http://21wdh.staszic.waw.pl" title="Tytuł" lang="en">'
+
+
+@pytest.mark.parametrize("body", [
+    # Metadata may follow the lyric.
+    '<lyric><block type="verse"><row>a</row></block></lyric><artist>Ktoś</artist><genre>x</genre>',
+    '<lyric/><artist>Ktoś</artist>',
+    '<lyric\n><block type="verse"><row>a</row></block></lyric><alias>Inny</alias>',
+    # A comment before the lyric, and "</lyric>" inside a comment of the lyric, make it parse the whole file.
+    '<!-- <lyric> --><artist>Ktoś</artist><lyric><block type="verse"><row>a</row></block></lyric>',
+    '<lyric><!-- </lyric> --><block type="verse"><row>a</row></block></lyric><artist>Ktoś</artist>',
+    '<artist>Ktoś</artist><lyric><block type="verse"><row><![CDATA[<a>]]></row></block></lyric><genre>y</genre>',
+])
+def test_header_parse_of_edge_cases(tmp_path, body):
+    path = str(tmp_path / "song.xml")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(HEAD + body + "</song>\n")
+    assert SongMeta.parseFile(path).to_dict() == full_parse(path).to_dict()
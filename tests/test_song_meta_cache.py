@@ -0,0 +1,95 @@
+import os
+import shutil
+
+import pytest
+
+import src.lib.list_of_songs as loslib
+from src.lib.list_of_songs import SongMeta, SongMetaCache
+
+
+@pytest.fixture
+def song_file(song_files):
+    """A song file of the repository, restored after the test"""
+    path = song_files[0]
+    with open(path, "rb") as f:
+        content = f.read()
+    st = os.stat(path)
+    yield path
+    with open(path, "wb") as f:
+        f.write(content)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def cached_meta(cache_dir, path):
+    """SongMeta of the path from a freshly loaded cache (parsing and storing it on a miss), and whether it was a hit"""
+    cache = SongMetaCache(cache_dir)
+    song = cache.lookup(path)
+    hit = song is not None
+    if not hit:
+        song = SongMeta.parseFile(path).compute_sort_keys()
+        cache.store(song)
+    cache.save()
+    return song, hit
+
+
+def count_digests(monkeypatch):
+    digests = []
+    file_digest = loslib.file_digest
+    monkeypatch.setattr(loslib, "file_digest", lambda path: digests.append(path) or file_digest(path))
+    return digests
+
+
+def test_hit_after_save(cache_dir, song_file):
+    parsed, hit = cached_meta(cache_dir, song_file)
+    assert not hit
+    cached, hit = cached_meta(cache_dir, song_file)
+    assert hit
+    assert cached.to_dict() == parsed.to_dict()
+    assert cached.plik() == song_file
+
+
+def test_changed_content_misses(cache_dir, song_file):
+    cached_meta(cache_dir, song_file)
+    with open(song_file, "ab") as f:
+        f.write(b"\n")
+    assert not cached_meta(cache_dir, song_file)[1]
+
+
+def test_touched_file_is_revalidated_once(cache_dir, song_file, monkeypatch):
+    cached_meta(cache_dir, song_file)
+    os.utime(song_file, ns=(0, 0))
+    digests = count_digests(monkeypatch)
+    assert cached_meta(cache_dir, song_file)[1]
+    assert digests == [song_file]
+    # The refreshed stat is saved, so the next run doesn't hash the file again.
+    assert cached_meta(cache_dir, song_file)[1]
+    assert digests == [song_file]
+
+
+def test_load_song_metas_uses_cache(song_files, monkeypatch):
+    files = song_files[:50]
+    first = loslib.load_song_metas(files, jobs=1)
+    digests = count_digests(monkeypatch)
+    monkeypatch.setattr(SongMeta, "parseFile", staticmethod(lambda path: pytest.fail(f"{path} parsed again")))
+    second = loslib.load_song_metas(files, jobs=1)
+    assert digests == []
+    assert [song.to_dict() for song in second] == [song.to_dict() for song in first]
+
+
+def test_other_schema_drops_cache(cache_dir, song_file, monkeypatch):
+    cached_meta(cache_dir, song_file)
+    monkeypatch.setattr(SongMeta, "SCHEMA_VERSION", SongMeta.SCHEMA_VERSION + 1)
+    assert not cached_meta(cache_dir, song_file)[1]
+
+
+def test_removed_files_are_pruned(cache_dir, song_files):
+    # A copy inside the repository, so that it has a key of its own.
+    copy = os.path.join(os.path.dirname(song_files[0]), "zz_test_copy.xml")
+    shutil.copy(song_files[0], copy)
+    try:
+        cached_meta(cache_dir, copy)
+        assert SongMetaCache.key(copy) in SongMetaCache(cache_dir).entries
+    finally:
+        os.remove(copy)
+    cached_meta(cache_dir, song_files[1])
+    assert SongMetaCache.key(copy) not in SongMetaCache(cache_dir).entries
@@ -0,0 +1,77 @@
+import os
+import time
+
+import pytest
+
+import tex_format
+
+
+@pytest.fixture
+def pdflatex(monkeypatch):
+    """pdflatex_version() of an installed pdflatex, which must not be run"""
+    monkeypatch.setattr(tex_format, "_pdflatex_version", "pdfTeX 3.141592653")
+    monkeypatch.setattr(tex_format.subprocess, "run", lambda *args, **kwargs: pytest.fail("pdflatex was run"))
+
+
+def write(tmp_path, text):
+    path = tmp_path / "doc.tex"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_preamble_ends_at_begin_document(tmp_path):
+    assert tex_format.preamble(write(tmp_path, "\\documentclass{book}\n\\begin{document}\nx\n")) \
+        == "\\documentclass{book}\n"
+
+
+def test_preamble_ends_at_endofdump(tmp_path):
+    text = "\\documentclass{book}\n\\csname endofdump\\endcsname\n\\makeindex\n\\begin{document}\n"
+    assert tex_format.preamble(write(tmp_path, text)) == "\\documentclass{book}\n"
+
+
+def test_endofdump_after_begin_document_is_ignored(tmp_path):
+    text = "\\documentclass{book}\n\\begin{document}\n\\csname endofdump\\endcsname\n"
+    assert tex_format.preamble(write(tmp_path, text)) == "\\documentclass{book}\n"
+
+
+def test_no_preamble(tmp_path):
+    assert tex_format.preamble(write(tmp_path, "\\documentclass{book}\n")) is None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("\\documentclass{book}\n\\usepackage{songbook21wdh}\n", True),
+    ("\\documentclass{book}\n\\makeindex\n", False),
+    ("\\newwrite\\f\n\\immediate\\openout\\f=x.txt\n", False),
+    ("\\documentclass{book}\n% \\makeindex\n", True),
+    ("\\documentclass{book} % no \\immediate\\openout here\n", True),
+])
+def test_dumpable(text, expected):
+    assert tex_format.dumpable(text) == expected
+
+
+def test_existing_format_is_used(tmp_path, pdflatex):
+    tex_file = write(tmp_path, "\\documentclass{book}\n\\begin{document}\n")
+    name = tex_format.format_name(tex_format.preamble(tex_file))
+    os.makedirs(tex_format.format_dir())
+    open(os.path.join(tex_format.format_dir(), name + ".fmt"), "wb").close()
+    assert tex_format.prepare_format(tex_file, {}) == name
+
+
+def test_undumpable_preamble_gets_no_format(tmp_path, pdflatex):
+    tex_file = write(tmp_path, "\\documentclass{book}\n\\makeindex\n\\begin{document}\n")
+    assert tex_format.prepare_format(tex_file, {}) is None
+
+
+def test_failed_format_is_not_retried_for_a_while(tmp_path, pdflatex):
+    tex_file = write(tmp_path, "\\documentclass{book}\n\\begin{document}\n")
+    name = tex_format.format_name(tex_format.preamble(tex_file))
+    os.makedirs(tex_format.format_dir())
+    failed = os.path.join(tex_format.format_dir(), name + ".failed")
+    open(failed, "w").close()
+    assert tex_format.prepare_format(tex_file, {}) is None
+
+    # Once FAILED_RETRY_SECONDS passed, the format is built again.
+    old = time.time() - tex_format.FAILED_RETRY_SECONDS - 60
+    os.utime(failed, (old, old))
+    with pytest.raises(pytest.fail.Exception, match="pdflatex was run"):
+        tex_format.prepare_format(tex_file, {})
@@ -0,0 +1,86 @@
+import os
+import time
+
+import pytest
+
+import src.lib.tex_fragment_cache as tex_fragment_cache
+from src.lib.tex_fragment_cache import TexFragmentCache
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    template = tmp_path / "template.tex"
+    template.write_text("template")
+    song = tmp_path / "song.xml"
+    song.write_text("<song/>")
+    return str(template), str(song)
+
+
+def age(path, days):
+    old = time.time() - days * 24 * 3600
+    os.utime(path, (old, old))
+
+
+def test_put_and_get(cache_dir, inputs):
+    template, song = inputs
+    cache = TexFragmentCache(str(cache_dir), [template])
+    key = cache.key(song)
+    assert cache.get(key) is None
+    assert cache.missing([key]) == [0]
+    cache.put(key, "Zażółć \\dots")
+    assert cache.get(key) == "Zażółć \\dots"
+    assert cache.missing([key]) == []
+    assert (cache.hits, cache.misses) == (1, 2)
+    # Another process with the same inputs shares the fragment.
+    assert TexFragmentCache(str(cache_dir), [template]).get(key) == "Zażółć \\dots"
+
+
+def test_key_depends_on_song_inputs_and_versions(cache_dir, inputs, tmp_path):
+    template, song = inputs
+    key = TexFragmentCache(str(cache_dir), [template], versions=["jinja2 3.1.4"]).key(song)
+    assert TexFragmentCache(str(cache_dir), [template], versions=["jinja2 3.1.5"]).key(song) != key
+    with open(template, "a") as f:
+        f.write("changed")
+    assert TexFragmentCache(str(cache_dir), [template], versions=["jinja2 3.1.4"]).key(song) != key
+    copy = tmp_path / "copy.xml"
+    copy.write_text("<song/>")
+    cache = TexFragmentCache(str(cache_dir), [template])
+    assert cache.key(str(copy)) == cache.key(song)
+
+
+def test_failed_put_leaves_no_temporary_file(cache_dir, inputs, monkeypatch):
+    cache = TexFragmentCache(str(cache_dir), [inputs[0]])
+    key = cache.key(inputs[1])
+    def replace(src, dst):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, "replace", replace)
+    cache.put(key, "tex")
+    assert cache.get(key) is None
+    assert os.listdir(os.path.dirname(cache._path(key))) == []
+
+
+def test_prune_removes_unused_fragments(cache_dir, inputs):
+    cache = TexFragmentCache(str(cache_dir), [inputs[0]])
+    used, unused = "a" * 40, "b" * 40
+    cache.put(used, "used")
+    cache.put(unused, "unused")
+    for key in (used, unused):
+        age(cache._path(key), tex_fragment_cache.MAX_AGE_DAYS + 1)
+    leftover = os.path.join(os.path.dirname(cache._path(used)), "tmpxyz.tmp")
+    open(leftover, "w").close()
+    age(leftover, 1)
+    # Reading a fragment marks it as used.
+    assert cache.get(used) == "used"
+
+    assert cache.prune() == 2
+    assert cache.get(used) == "used"
+    assert cache.get(unused) is None
+    assert not os.path.exists(leftover)
+    # Pruned at most once a day, unless forced.
+    age(cache._path(used), tex_fragment_cache.MAX_AGE_DAYS + 1)
+    assert cache.prune() == 0
+    assert cache.prune(force=True) == 1
+
+
+def test_prune_without_cache(tmp_path, inputs):
+    assert TexFragmentCache(str(tmp_path / "none"), [inputs[0]]).prune() == 0
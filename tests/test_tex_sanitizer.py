@@ -0,0 +1,59 @@
+import pytest
+
+import song2tex as s2t
+import src.lib.song_ir as song_ir
+import src.lib.tex_sanitizer as tex_sanitizer
+from benchmarks.tex_sanitizer_benchmark import legacy_sanitize, legacy_tex_escape, texts_of
+
+ESCAPE_CASES = [
+    None,
+    "",
+    "Zażółć gęślą jaźń",
+    "".join(tex_sanitizer.TEX_ESCAPES),
+    "Rock & roll, 100% \"na\" _żywo_ {#1} ~ ^ \\ <a> $5",
+    "Tak.. i tak... i tak.... i tak.....",
+]
+
+SANITIZE_CASES = [
+    "Zwykły tekst",
+    "".join(tex_sanitizer.CHARACTER_REPLACEMENTS),
+    "arrows \uFE0F\u2B07 \uFE0F\U0001F53D \u25B2 \u2B06",
+    # Replaced characters inside unsupported ranges don't drop the song.
+    "\u0435cho",
+    "line 1\nline 2 \u0416uk",
+    "\u263A smile",
+    "\u3042 \u5000 \u6600 \u8A00 \u1000 \u0500 a\u0300",
+]
+
+
+@pytest.mark.parametrize("text", ESCAPE_CASES)
+def test_tex_escape_cases(text):
+    assert tex_sanitizer.tex_escape(text) == legacy_tex_escape(text)
+
+
+@pytest.mark.parametrize("text", SANITIZE_CASES)
+def test_sanitize_cases(text):
+    sanitized, reason = tex_sanitizer.sanitize(text)
+    assert ("" if reason else sanitized) == legacy_sanitize(text)
+
+
+@pytest.mark.parametrize("name, first, last", tex_sanitizer.UNSUPPORTED_SCRIPTS)
+def test_unsupported_scripts_drop_the_song(name, first, last):
+    for char in (first, last):
+        assert name in tex_sanitizer.sanitize(f"abc {char}")[1]
+        assert legacy_sanitize(f"abc {char}") == ""
+
+
+def test_unsupported_character_is_reported():
+    assert tex_sanitizer.sanitize("a\nb \u0416uk")[1] == \
+        "unsupported Cyrillic character 'Ж' (U+0416 CYRILLIC CAPITAL LETTER ZHE) in line 2"
+
+
+def test_corpus_matches_legacy_implementation(song_files):
+    songs = [song_ir.parse_song(path) for path in song_files]
+    texts = [text for song in songs for text in texts_of(song)]
+    assert [tex_sanitizer.tex_escape(text) for text in texts] == [legacy_tex_escape(text) for text in texts]
+    for song in songs:
+        rendered = s2t.template().render(song=s2t.Song.fromIR(song))
+        sanitized, reason = tex_sanitizer.sanitize(rendered)
+        assert ("" if reason else sanitized) == legacy_sanitize(rendered), song.path